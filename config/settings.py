@@ -8,14 +8,25 @@ class Settings(BaseSettings):
     DEBUG: bool = False
 
     # Aliyun OSS & DashScope
-    DASHSCOPE_API_KEY: str
-    OSS_ACCESS_KEY_ID: str
-    OSS_ACCESS_KEY_SECRET: str
+    # 允许为空：只读看板 / 模拟模式无需云端密钥，缺失时由对应客户端在实例化时报错
+    DASHSCOPE_API_KEY: str = ""
+    OSS_ACCESS_KEY_ID: str = ""
+    OSS_ACCESS_KEY_SECRET: str = ""
     OSS_ENDPOINT: str = "http://oss-cn-shenzhen.aliyuncs.com"
-    OSS_BUCKET_NAME: str
+    OSS_BUCKET_NAME: str = ""
+
+    # 送入 LLM 前压缩实录 (去语气词/重复、折叠连续附和、合并同一说话人)；入库仍保存原文
+    LLM_COMPACT_TRANSCRIPT: bool = True
 
     # Paths
     DB_PATH: str = "data/db/dental_consultation_db.csv"
+    # 主库编码：历史数据为 gbk；设为 utf-8 后写入无损，且可走 Arrow 快速读取
+    # 已有 gbk 主库需先转换：python -m src.database.manage_partitions reencode
+    DB_ENCODING: str = "gbk"
+    # 按月分区存储（迁移：python -m src.database.manage_partitions migrate）
+    DB_PARTITIONED: bool = False
+    # 多门店部署时的门店名：写入 <分区目录>/<门店>/，读取时只看本门店；为空则读取全部门店
+    CLINIC_NAME: str = ""
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
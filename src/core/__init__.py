@@ -1,5 +1,6 @@
 from .models import ConsultationReport
 from .llm_engine import AnalysisEngine
 from .asr_client import ASRClient
+from .transcript import compact_transcript
 
-__all__ = ["ConsultationReport", "AnalysisEngine", "ASRClient"]
\ No newline at end of file
+__all__ = ["ConsultationReport", "AnalysisEngine", "ASRClient", "compact_transcript"]
\ No newline at end of file
@@ -2,10 +2,6 @@ import time
 import logging
 import os
 import json
-import requests
-import oss2
-import dashscope
-from dashscope.audio.asr import Transcription
 from http import HTTPStatus
 from config.settings import settings
 
@@ -13,6 +9,14 @@ logger = logging.getLogger(__name__)
 
 class ASRClient:
     def __init__(self):
+        # 重依赖延迟到实例化时导入，只读数据的会话不需要付出这部分启动成本
+        import oss2
+        import dashscope
+
+        if not (settings.DASHSCOPE_API_KEY and settings.OSS_ACCESS_KEY_ID
+                and settings.OSS_ACCESS_KEY_SECRET and settings.OSS_BUCKET_NAME):
+            raise ValueError("缺少 DashScope / OSS 配置，请检查 .env 文件")
+
         dashscope.api_key = settings.DASHSCOPE_API_KEY
         self.auth = oss2.Auth(settings.OSS_ACCESS_KEY_ID, settings.OSS_ACCESS_KEY_SECRET)
         self.bucket = oss2.Bucket(self.auth, settings.OSS_ENDPOINT, settings.OSS_BUCKET_NAME)
@@ -69,6 +73,9 @@ class ASRClient:
         return "\n\n".join(dialogue_lines)
 
     def transcribe(self, audio_path: str) -> str:
+        import requests
+        from dashscope.audio.asr import Transcription
+
         if not os.path.exists(audio_path):
             return "Error: 文件不存在"
 
@@ -1,13 +1,18 @@
 import logging
-from langchain_community.chat_models import ChatTongyi
-from langchain_core.messages import SystemMessage, HumanMessage
 from config.settings import settings
 from src.core.models import ConsultationReport
+from src.core.transcript import compact_transcript
 
 logger = logging.getLogger(__name__)
 
 class AnalysisEngine:
     def __init__(self):
+        # langchain 导入较慢，延迟到真正需要分析时再加载
+        from langchain_community.chat_models import ChatTongyi
+
+        if not settings.DASHSCOPE_API_KEY:
+            raise ValueError("缺少 DASHSCOPE_API_KEY，请检查 .env 文件")
+
         self.llm = ChatTongyi(
             model="qwen-plus", # 建议使用 plus 或 max 以获得更好的推理能力
             api_key=settings.DASHSCOPE_API_KEY,
@@ -17,8 +22,13 @@ class AnalysisEngine:
         self.parser = self.llm.with_structured_output(ConsultationReport)
 
     def analyze_consultation(self, text: str) -> ConsultationReport:
+        from langchain_core.messages import SystemMessage, HumanMessage
+
         if not text:
             raise ValueError("输入文本为空")
+        # 只压缩送给 LLM 的文本，调用方保存的对话实录不受影响
+        if settings.LLM_COMPACT_TRANSCRIPT:
+            text = compact_transcript(text)
 
         system_prompt = """
         你是一名专业的口腔门诊运营督导（Supervisor）。
@@ -0,0 +1,123 @@
+import re
+
+# 说话人行格式与 ASRClient._format_dialogue 输出保持一致
+_TURN = re.compile(r"^【说话人\s*(\S+?)】\s*[:：]\s*(.*)$")
+_WHITESPACE = re.compile(r"\s+")
+# 语气词 (单字)；只在分句开头或整句都是语气词时删除，句中的 "啊" "呀" 等保留
+# 不收录 "额"：会误伤 "额外" "金额"
+FILLERS = "嗯呃哎唉诶欸哦噢喔啊"
+# 句首语气词后接标点时整段删除 ("哎，嗯他..." -> "他...")
+_LEADING_FILLERS = re.compile(rf"(?:^|(?<=[，。？！、；,.?!;]))\s*[{FILLERS}]+[，、,\s]+")
+# 句首直接连着正文时只删除不会构词的 "嗯" "呃" ("嗯他已经" -> "他已经"，"哎呀" 保留)
+_LEADING_HUMS = re.compile(r"(?:^|(?<=[，。？！、；,.?!;]))\s*[嗯呃]+")
+_ONLY_FILLERS = re.compile(rf"^[{FILLERS}，。？！、；,.?!;\s]*$")
+# 数字 (中文数字与阿拉伯数字)：报价、颗数、电话号码，任何折叠/去重规则都不处理
+NUMERALS = "零〇一二两三四五六七八九十百千万亿0123456789"
+# 同一汉字连续 3 次及以上 ("要要要要" -> "要")；叠词 "看看" "谢谢" 只有两次，不受影响
+_REPEATED_CHAR = re.compile(rf"(?![{NUMERALS}])([一-鿿])\1{{2,}}")
+# 2~4 字片段连续出现 3 次及以上 ("这个这个这个" -> "这个")；
+# 只出现两次的多为正常表达 ("考虑考虑" "一颗一颗")，保留
+_REPEATED_PHRASE = re.compile(r"([一-鿿]{2,4}?)\1{2,}")
+_CLAUSE = re.compile(r"[^，。？！、；,.?!;]+[，。？！、；,.?!;]*")
+# 删掉分句后留下的连续标点：逗号后接句号时只留句号，连续逗号只留一个
+_SOFT_BEFORE_HARD = re.compile(r"[，、,；;\s]+(?=[。？！.?!])")
+_SOFT_RUN = re.compile(r"([，、,；;])[，、,；;\s]+")
+_HARD_RUN = re.compile(r"([。？！])。+")
+_PUNCT = "，。？！、；,.?!;"
+# 只由这些应答词组成的短句视为附和 (back-channel)；"好的" "可以" 可能是成交/同意的证据，
+# 只折叠连续的附和 (对方也只是附和时)，不删除对实质内容的回应
+ACKNOWLEDGEMENTS = {"对", "是", "好", "行", "嗯", "哦", "噢", "是的", "对的", "好的", "对对", "对对对", "是是", "好好", "可以", "知道了"}
+MICRO_TURN_CHARS = 4
+
+
+def clean_utterance(text: str) -> str:
+    """
+    单句清洗 (确定性规则)：压缩空白、去掉句首语气词、折叠重复字词与重复分句
+    不改写措辞，数字、价格、否定词等审计相关内容原样保留
+    """
+    text = _WHITESPACE.sub(" ", text).strip()
+    text = _REPEATED_CHAR.sub(r"\1", text)
+    text = _REPEATED_PHRASE.sub(lambda m: m.group(0) if _has_numeral(m.group(0)) else m.group(1), text)
+    text = _LEADING_FILLERS.sub("", text)
+    text = _LEADING_HUMS.sub("", text)
+
+    clauses, bodies = [], []
+    for clause in _CLAUSE.findall(text):
+        body = clause.strip().rstrip(_PUNCT)
+        if not body or _ONLY_FILLERS.match(body):
+            continue
+        # 前两个分句内出现过的重复分句只保留一次 ("四个就够了。对对，四个就够了。")；含数字的不去重
+        if body in bodies[-2:] and not _has_numeral(body):
+            continue
+        clauses.append(clause.strip())
+        bodies.append(body)
+    text = _SOFT_BEFORE_HARD.sub("", "".join(clauses))
+    text = _HARD_RUN.sub(r"\1", _SOFT_RUN.sub(r"\1", text)).lstrip("，、,；; ")
+    # 句末的分句被删掉后不留下悬空的逗号
+    trimmed = text.rstrip("，、,；; ")
+    return trimmed + "。" if trimmed and trimmed != text else trimmed
+
+
+def _has_numeral(text: str) -> bool:
+    return any(c in NUMERALS for c in text)
+
+
+def _is_acknowledgement(text: str) -> bool:
+    """不超过 MICRO_TURN_CHARS 字、且每个分句都是应答词的轮次 ("对对。" "好，行。")"""
+    parts = [p for p in re.split(rf"[{_PUNCT}\s]+", text) if p]
+    return bool(parts) and sum(map(len, parts)) <= MICRO_TURN_CHARS and all(p in ACKNOWLEDGEMENTS for p in parts)
+
+
+def parse_turns(text: str) -> list:
+    """
+    把 "【说话人 N】: ..." 格式的实录拆成 [(说话人, 文本), ...]
+    带标签轮次后的无标签行视为该轮的续行，以句号衔接；其余无标签行各自成为说话人为 None 的轮次
+    (如 "咨询师：您好" 这类非 ASR 格式的文本)，不相互合并
+    """
+    turns = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        match = _TURN.match(line)
+        if match:
+            turns.append([match.group(1), match.group(2)])
+        elif turns and turns[-1][0] is not None:
+            previous = turns[-1][1]
+            turns[-1][1] = previous + line if not previous or previous.endswith(tuple(_PUNCT)) else previous + "。" + line
+        else:
+            turns.append([None, line])
+    return turns
+
+
+def compact_transcript(text: str) -> str:
+    """
+    送入 LLM 前的实录压缩：
+    1. 逐轮清洗 (语气词、重复、空白)；只剩语气词的轮次丢弃，单独的 "嗯" "哦" 视为应答保留
+    2. 附和短句 ("好的。" "对对。") 保留；只有回应的上一轮本身也是附和时才折叠掉
+    3. 相邻的同一说话人轮次合并；无说话人标签的行保持分行
+    结果只用于分析；入库的 对话实录 仍保存原文
+    """
+    if not isinstance(text, str) or not text.strip():
+        return text
+
+    turns = []
+    for speaker, raw in parse_turns(text):
+        utterance = clean_utterance(raw)
+        if not utterance:
+            # "嗯。" "嗯嗯" 单独成轮时常是对上一句的认可，统一为一个应答词
+            body = re.sub(rf"[{_PUNCT}\s]+", "", raw)
+            if not body or not set(body) <= set("嗯哦噢"):
+                continue
+            utterance = body[0] + "。"
+        if turns and turns[-1][0] != speaker and _is_acknowledgement(utterance) \
+                and _is_acknowledgement(turns[-1][1]):
+            continue
+        if turns and speaker is not None and turns[-1][0] == speaker:
+            turns[-1][1] += utterance if turns[-1][1].endswith(tuple(_PUNCT)) else "。" + utterance
+        else:
+            turns.append([speaker, utterance])
+
+    if not turns:
+        return text.strip()
+    return "\n".join(f"【说话人 {s}】: {u}" if s is not None else u for s, u in turns)
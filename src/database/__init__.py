@@ -1,3 +1,14 @@
 from .repository import ConsultationRepository
+from .rollups import RollupStore
+from .snapshots import SnapshotStore
 
-__all__ = ["ConsultationRepository"]
\ No newline at end of file
+__all__ = ["ConsultationRepository", "RollupStore", "SimilarityIndex", "SnapshotStore"]
+
+
+def __getattr__(name):
+    # SimilarityIndex 依赖 scipy，按需导入，避免拖慢看板启动
+    if name == "SimilarityIndex":
+        from .similarity import SimilarityIndex
+
+        return SimilarityIndex
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
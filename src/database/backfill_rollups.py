@@ -0,0 +1,16 @@
+"""
+聚合表回填命令：从明细全量重建 日/周/月 × 咨询师 聚合表
+用法：python -m src.database.backfill_rollups
+"""
+from src.database.repository import ConsultationRepository
+from src.database.rollups import GRAINS
+
+
+def main():
+    repo = ConsultationRepository()
+    repo.rebuild_rollups()
+    print(f"✅ 聚合表回填完成: {', '.join(repo.rollups.path(g) for g in GRAINS)}")
+
+
+if __name__ == "__main__":
+    main()
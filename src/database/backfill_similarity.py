@@ -0,0 +1,27 @@
+"""
+相似案例索引维护命令
+用法：
+    python -m src.database.backfill_similarity                    # 从明细全量重建 TF-IDF 索引
+    python -m src.database.backfill_similarity --compact          # 增量尾部较长时重新生成倒排表 (建议定时执行)
+    python -m src.database.backfill_similarity --compact --force  # 无论尾部长短都重新生成倒排表
+"""
+import sys
+
+from src.database.repository import ConsultationRepository
+
+
+def main():
+    args = set(sys.argv[1:])
+    repo = ConsultationRepository()
+    if "--compact" in args:
+        compacted = repo.compact_similarity(force="--force" in args)
+        print(f"✅ 已更新 {len(compacted)} 个索引的倒排表")
+        for path in compacted:
+            print(f"   {path}")
+        return
+    repo.rebuild_similarity()
+    print(f"✅ 相似案例索引重建完成: {repo.similarity.index_dir} ({len(repo.similarity)} 条)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""
+列式快照导出命令 (供 BI 每晚拉取)
+用法：
+    python -m src.database.export_snapshot              # 增量导出 Arrow IPC
+    python -m src.database.export_snapshot --parquet    # 增量导出 Parquet
+    python -m src.database.export_snapshot --full       # 清空后全量导出
+"""
+import sys
+
+from src.database.repository import ConsultationRepository
+
+
+def main():
+    args = set(sys.argv[1:])
+    repo = ConsultationRepository()
+    try:
+        path = repo.export_snapshot(full="--full" in args, fmt="parquet" if "--parquet" in args else "arrow")
+    except ImportError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    if path:
+        print(f"✅ 快照已导出: {path}")
+    else:
+        print("ℹ️ 没有新记录需要导出")
+
+
+if __name__ == "__main__":
+    main()
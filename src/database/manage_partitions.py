@@ -0,0 +1,45 @@
+"""
+主库存储维护命令
+用法：
+    python -m src.database.manage_partitions migrate          # 单文件主库按月拆分为分区
+    python -m src.database.manage_partitions compact          # 已结束月份归档为 Parquet
+    python -m src.database.manage_partitions reencode [编码]  # 主库从 DB_ENCODING 转为 utf-8 (或指定编码)
+"""
+import sys
+
+from src.database.repository import ConsultationRepository
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    repo = ConsultationRepository()
+
+    if command == "migrate":
+        try:
+            count = repo.migrate_to_partitions()
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"✅ 已迁移 {count} 条记录至 {repo.partition_root}，请设置 DB_PARTITIONED=true 启用分区模式")
+    elif command == "compact":
+        try:
+            archived = repo.compact_partitions()
+        except (ValueError, ImportError) as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"✅ 已归档 {len(archived)} 个分区")
+        for path in archived:
+            print(f"   {path}")
+    elif command == "reencode":
+        target = sys.argv[2] if len(sys.argv) > 2 else "utf-8"
+        converted = repo.reencode(target)
+        print(f"✅ 已转换 {len(converted)} 个文件为 {target}，请设置 DB_ENCODING={target}")
+        for path in converted:
+            print(f"   {path}")
+    else:
+        print(__doc__)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
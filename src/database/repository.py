@@ -1,29 +1,237 @@
 import pandas as pd
+import numpy as np
 import os
+import re
+import contextlib
 import datetime
+import importlib.util
+import threading
 from config.settings import settings
 from src.core.models import ConsultationReport
+from src.database.rollups import RollupStore
+from src.database.snapshots import SnapshotStore, summarize_by_consultant
+
+# pyarrow 为可选依赖：安装后 UTF-8 主库走 Arrow 多线程解析
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+# 主库字段
+DB_COLUMNS = [
+    "时间", "咨询师", "患者姓名", "是否成交",
+    "客户意向", "评分", "痛点", "优点",
+    "失误点", "下一步建议", "摘要", "对话实录"
+]
+# 紧凑模式下转为 category 的低基数字段
+CATEGORY_COLUMNS = ["咨询师", "是否成交", "客户意向", "门店"]
+# 始终按字符串读取的字段 (避免 "007" 之类的姓名被解析成数字)
+TEXT_COLUMNS = ["咨询师", "患者姓名"]
+TEXT_DTYPES = {c: str for c in TEXT_COLUMNS}
+# 分区模式下每条记录携带全局递增的记录ID；单文件模式下记录ID即行号
+RECORD_ID = "记录ID"
+TIME_FORMAT = "%Y-%m-%d %H:%M"
+# 分区文件名：当月为可追加的 CSV，已结束月份压缩为 Parquet
+_PARTITION_FILE = re.compile(r"^(\d{4}-\d{2})\.(csv|parquet)$")
+# 记录ID分配：进程内用线程锁，多进程 (多个看板实例 / 维护命令) 之间用锁文件
+_SEQUENCE_LOCK = threading.Lock()
+
+
+@contextlib.contextmanager
+def _file_lock(path: str):
+    """基于锁文件的跨进程互斥 (阻塞等待)"""
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK 重试约 10 秒后仍失败会抛错，继续等待
+                    pass
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
 
 class ConsultationRepository:
     def __init__(self):
         self.db_path = settings.DB_PATH
+        self.encoding = settings.DB_ENCODING
+        # 按月分区存储 (可选再按门店分目录)：<主库名>_partitions/[门店/]YYYY-MM.csv|parquet
+        self.partitioned = settings.DB_PARTITIONED
+        self.clinic = settings.CLINIC_NAME
+        self.partition_root = os.path.splitext(self.db_path)[0] + "_partitions"
+        # 看板派生表 / 对话实录缓存：{(数据版本, ...): 数据}，只保留最新版本
+        self._frame_cache = {}
+        self._transcript_cache = {}
+        self._summary_cache = {}
+        self._save_counter = 0
+        # 看板通过 cache_resource 在所有会话间共享同一实例：明细、聚合表、相似索引的写入串行执行
+        self._write_lock = threading.RLock()
+        # 聚合表 / 相似索引 / 快照按门店隔离：门店部署下放在门店分区目录内
+        self.store_path = self._store_path(self.clinic)
+        self.rollups = RollupStore(self.store_path)
+        self._similarity = None
+        self.snapshots = SnapshotStore(self.store_path)
         self._init_db()
 
+    @property
+    def similarity(self):
+        """相似案例索引：依赖 scipy，首次用到时才导入，看板启动不受影响"""
+        with self._write_lock:
+            if self._similarity is None:
+                from src.database.similarity import SimilarityIndex
+
+                self._similarity = SimilarityIndex(self.store_path)
+        return self._similarity
+
+    def _store_path(self, clinic: str) -> str:
+        """派生数据的基准路径：门店部署为 <分区目录>/<门店>/<主库文件名>，否则为主库路径"""
+        if self.partitioned and clinic:
+            return os.path.join(self._partition_dir(clinic), os.path.basename(self.db_path))
+        return self.db_path
+
     def _init_db(self):
         """确保 CSV 文件和目录存在，并初始化表头"""
+        if self.partitioned:
+            os.makedirs(self._partition_dir(self.clinic), exist_ok=True)
+            return
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
         if not os.path.exists(self.db_path):
-            df = pd.DataFrame(columns=[
-                "时间", "咨询师", "患者姓名", "是否成交", 
-                "客户意向", "评分", "痛点", "优点", 
-                "失误点", "下一步建议", "摘要", "对话实录"  # <--- 新增字段
-            ])
-            df.to_csv(self.db_path, index=False, encoding="gbk")
+            df = pd.DataFrame(columns=DB_COLUMNS)
+            df.to_csv(self.db_path, index=False, encoding=self.encoding)
+
+    def _is_utf8(self) -> bool:
+        return self.encoding.lower().replace("-", "").replace("_", "") in ("utf8", "utf8sig")
+
+    def _read_file(self, path: str, usecols=None, fast: bool = True) -> pd.DataFrame:
+        """
+        读取单个数据文件，usecols 中文件不存在的列会被忽略
+        CSV: UTF-8 且安装了 pyarrow 时走 Arrow 快速路径 (fast=True)，否则回退到 C 引擎
+        Parquet: 按列裁剪读取
+        """
+        if usecols is not None:
+            columns = self._file_columns(path)
+            usecols = [c for c in usecols if c in columns]
+        if path.endswith(".parquet"):
+            return pd.read_parquet(path, columns=usecols)
+        if fast and self._is_utf8() and HAS_PYARROW:
+            import pyarrow as pa
+            import pyarrow.csv as pa_csv
+
+            # 对话实录含换行，必须开启 newlines_in_values（pandas 的 pyarrow 引擎不支持该选项）
+            table = pa_csv.read_csv(
+                path,
+                parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+                convert_options=pa_csv.ConvertOptions(
+                    include_columns=usecols,
+                    column_types={c: pa.string() for c in TEXT_COLUMNS},
+                ),
+            )
+            return table.to_pandas()
+        return pd.read_csv(path, encoding=self.encoding, usecols=usecols, dtype=TEXT_DTYPES)
+
+    def _file_columns(self, path: str) -> list:
+        if path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+
+            return list(pq.read_schema(path).names)
+        return list(pd.read_csv(path, encoding=self.encoding, nrows=0).columns)
+
+    def _partition_dir(self, clinic: str = "") -> str:
+        return os.path.join(self.partition_root, clinic) if clinic else self.partition_root
+
+    def _data_files(self, start=None, end=None) -> list:
+        """
+        列出需要读取的数据文件 [(路径, 门店), ...]
+        分区模式下按月份裁剪：只返回与 [start, end] 有交集的分区
+        """
+        if not self.partitioned:
+            return [(self.db_path, "")] if os.path.exists(self.db_path) else []
+        if not os.path.isdir(self.partition_root):
+            return []
+
+        if self.clinic:
+            dirs = [(self._partition_dir(self.clinic), self.clinic)]
+        else:
+            dirs = [(self.partition_root, "")] + [
+                (os.path.join(self.partition_root, name), name)
+                for name in sorted(os.listdir(self.partition_root))
+                if os.path.isdir(os.path.join(self.partition_root, name))
+            ]
+        start_month = pd.Timestamp(start).strftime("%Y-%m") if start is not None else None
+        end_month = pd.Timestamp(end).strftime("%Y-%m") if end is not None else None
+
+        files = []
+        for directory, clinic in dirs:
+            if not os.path.isdir(directory):
+                continue
+            months = {}
+            for name in sorted(os.listdir(directory)):
+                match = _PARTITION_FILE.match(name)
+                if not match:
+                    continue
+                month = match.group(1)
+                if (start_month and month < start_month) or (end_month and month > end_month):
+                    continue
+                # 归档过程中 CSV 与 Parquet 可能短暂并存，以 Parquet 为准
+                if month not in months or name.endswith(".parquet"):
+                    months[month] = name
+            files.extend((os.path.join(directory, months[m]), clinic) for m in sorted(months))
+        return files
+
+    def _read_all(self, usecols=None, start=None, end=None, fast: bool = True) -> pd.DataFrame:
+        """
+        读取 (裁剪后的) 全部数据文件并合并，索引为记录ID
+        start / end 为可选的时间范围 (含端点)，先按分区裁剪，再按行过滤
+        """
+        if usecols is not None:
+            extra = [RECORD_ID] if self.partitioned else []
+            if start is not None or end is not None:
+                extra.append("时间")
+            usecols = list(dict.fromkeys(list(usecols) + extra))
+
+        frames = []
+        for path, clinic in self._data_files(start, end):
+            frame = self._read_file(path, usecols, fast)
+            if clinic:
+                frame["门店"] = clinic
+            frames.append(frame)
+        if not frames:
+            return pd.DataFrame(columns=usecols if usecols is not None else DB_COLUMNS)
+
+        df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+        if self.partitioned and RECORD_ID in df.columns:
+            df = df.set_index(RECORD_ID).sort_index()
+            df.index = df.index.astype("int64")
+            df.index.name = None
+
+        if (start is not None or end is not None) and not df.empty:
+            times = pd.to_datetime(df["时间"], format=TIME_FORMAT, errors="coerce")
+            mask = pd.Series(True, index=df.index)
+            if start is not None:
+                mask &= times >= pd.Timestamp(start)
+            if end is not None:
+                mask &= times <= pd.Timestamp(end)
+            df = df[mask]
+        return df
 
     def save_record(self, consultant: str, patient: str, is_deal: str, report: ConsultationReport, transcript: str):
         """保存单条分析记录，包括对话实录"""
+        now = datetime.datetime.now().strftime(TIME_FORMAT)
         new_row = {
-            "时间": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
+            "时间": now,
             "咨询师": consultant,
             "患者姓名": patient,
             "是否成交": is_deal,
@@ -36,29 +244,102 @@ class ConsultationRepository:
             "摘要": report.summary,
             "对话实录": transcript  # <--- 保存对话内容
         }
-        
-        try:
-            # 读取旧数据
-            if os.path.exists(self.db_path):
-                df = pd.read_csv(self.db_path, encoding="gbk")
-            else:
-                self._init_db()
-                df = pd.read_csv(self.db_path, encoding="gbk")
-            
-            # 追加新数据 (concat 会自动处理列对齐，如果旧数据没有"对话实录"列，会自动填充 NaN)
-            df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-            df.to_csv(self.db_path, index=False, encoding="gbk", errors="replace")
+
+        with self._write_lock:
+            try:
+                if self.partitioned:
+                    record_index = self._append_partition(new_row)
+                else:
+                    record_index = self._rewrite_single_file(new_row)
+                self.invalidate_cache()
+            except Exception as e:
+                print(f"Database Error: {e}")
+                return False
+
+            # 增量更新聚合表；失败不影响明细落库，可通过 rebuild_rollups 回填修复
+            # 门店的记录同时计入全部门店的聚合表 (总部看板)
+            stores = [self.rollups]
+            if self.store_path != self.db_path:
+                stores.append(RollupStore(self.db_path))
+            try:
+                for store in stores:
+                    store.add_record(now, consultant, is_deal, report.sales_score, report.bad_points)
+            except Exception as e:
+                print(f"Rollup Error: {e}")
+
+            # 增量加入相似案例索引；失败同样可通过 rebuild_similarity 修复
+            # 门店的记录同时加入总部索引 (记录ID全局唯一)
+            try:
+                from src.database.similarity import document_text
+
+                text = document_text(report.pain_points, report.summary, report.bad_points, transcript)
+                for index in self._similarity_indexes():
+                    index.add(record_index, text, report.sales_score)
+            except Exception as e:
+                print(f"Similarity Index Error: {e}")
             return True
-        except Exception as e:
-            print(f"Database Error: {e}")
-            return False
 
-    def load_records(self) -> pd.DataFrame:
-        """加载所有记录 (用于主管端统计)"""
-        if not os.path.exists(self.db_path):
+    def _rewrite_single_file(self, new_row: dict) -> int:
+        """单文件模式：读出全表追加后整体写回，返回新记录的行号"""
+        # 读取旧数据
+        if os.path.exists(self.db_path):
+            df = pd.read_csv(self.db_path, encoding=self.encoding, dtype=TEXT_DTYPES)
+        else:
+            self._init_db()
+            df = pd.read_csv(self.db_path, encoding=self.encoding, dtype=TEXT_DTYPES)
+
+        # 追加新数据 (concat 会自动处理列对齐，如果旧数据没有"对话实录"列，会自动填充 NaN)
+        df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
+        df.to_csv(self.db_path, index=False, encoding=self.encoding, errors="replace")
+        return len(df) - 1
+
+    def _append_partition(self, new_row: dict) -> int:
+        """分区模式：只追加写入当月分区，写入成本与历史数据量无关，返回记录ID"""
+        directory = self._partition_dir(self.clinic)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{new_row['时间'][:7]}.csv")
+
+        # 分配ID与追加写入在同一把锁内完成：并发保存时ID不重复，分区表头也只写一次
+        with _SEQUENCE_LOCK, _file_lock(os.path.join(self.partition_root, "_sequence.lock")):
+            record_id = self._next_record_id()
+            row = pd.DataFrame([{RECORD_ID: record_id, **new_row}], columns=[RECORD_ID] + DB_COLUMNS)
+            exists = os.path.exists(path)
+            row.to_csv(path, mode="a", header=not exists, index=False, encoding=self.encoding, errors="replace")
+        return record_id
+
+    def _next_record_id(self) -> int:
+        """分配记录ID (调用方需持有序号锁)：序号文件丢失时从现有分区中的最大ID恢复"""
+        path = os.path.join(self.partition_root, "_sequence")
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                next_id = int(f.read().strip() or 0)
+        else:
+            ids = self._read_all([RECORD_ID]).index
+            next_id = int(ids.max()) + 1 if len(ids) else 0
+        self._write_sequence(next_id + 1)
+        return next_id
+
+    def _write_sequence(self, next_id: int):
+        """先写临时文件再替换：读取方不会读到被截断的空文件"""
+        os.makedirs(self.partition_root, exist_ok=True)
+        path = os.path.join(self.partition_root, "_sequence")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(str(next_id))
+        os.replace(path + ".tmp", path)
+
+    def load_records(self, compact: bool = False, start=None, end=None) -> pd.DataFrame:
+        """
+        加载记录 (用于主管端统计)，start / end 可限定时间范围 (分区模式下只读取相关月份)
+        compact=True: 不含对话实录，低基数字段为 category，评分为 int16、时间为 datetime，
+        供看板表格使用；实录通过 load_transcript 按需读取
+        """
+        if not self._data_files(start, end):
             return pd.DataFrame()
         try:
-            df = pd.read_csv(self.db_path, encoding="gbk")
+            if compact:
+                return self._load_compact(start, end)
+
+            df = self._read_all(start=start, end=end, fast=False)
             # 处理空值，防止 UI 报错
             df.fillna("", inplace=True)
             
@@ -72,4 +353,265 @@ class ConsultationRepository:
             return df.iloc[::-1] # 倒序返回（最新的在最前）
         except Exception as e:
             print(f"Load Error: {e}")
-            return pd.DataFrame()
\ No newline at end of file
+            return pd.DataFrame()
+
+    def _load_compact(self, start=None, end=None) -> pd.DataFrame:
+        usecols = [c for c in DB_COLUMNS if c != "对话实录"]
+        df = self._read_all(usecols, start, end)
+        df["时间"] = pd.to_datetime(df["时间"], format=TIME_FORMAT, errors="coerce")
+        df["评分"] = pd.to_numeric(df["评分"], errors="coerce").fillna(0).astype("int16")
+        # 文本字段的空值统一为 ""，避免看板显示 "nan"；category 字段保留缺失值
+        text_columns = [c for c in df.columns if c not in CATEGORY_COLUMNS and c not in ("时间", "评分")]
+        df[text_columns] = df[text_columns].fillna("")
+        for col in CATEGORY_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].astype("category")
+        return df.iloc[::-1] # 倒序返回（最新的在最前），索引即记录ID
+
+    def load_transcript(self, record_index: int, when=None) -> str:
+        """
+        按记录ID (紧凑表的索引) 读取对话实录，同一数据版本只解析一次该列
+        传入记录时间 when 时只读取所在月份的分区
+        """
+        month = pd.Timestamp(when).strftime("%Y-%m") if self.partitioned and not pd.isna(when) else None
+        key = (self.data_version(), month)
+        transcripts = self._transcript_cache.get(key)
+        if transcripts is None:
+            if month:
+                first = pd.Timestamp(f"{month}-01")
+                bounds = (first, first + pd.offsets.MonthBegin(1) - pd.Timedelta(minutes=1))
+            else:
+                bounds = (None, None)
+            frame = self._read_all(["对话实录"], *bounds)
+            transcripts = frame["对话实录"] if "对话实录" in frame.columns else pd.Series(dtype=object)
+            self._transcript_cache = {k: v for k, v in self._transcript_cache.items() if k[0] == key[0]}
+            self._transcript_cache[key] = transcripts
+        value = transcripts.get(int(record_index))
+        return "" if value is None or pd.isna(value) else str(value)
+
+    def data_version(self) -> tuple:
+        """
+        数据版本号 = (本进程写入次数, 最新修改时间, 总大小, 文件数)
+        其他进程改写数据文件时 mtime/size 也会变化，缓存同样会失效
+        """
+        stats = []
+        for path, _ in self._data_files():
+            try:
+                stats.append(os.stat(path))
+            except FileNotFoundError:
+                pass
+        if not stats:
+            return (self._save_counter, 0, 0, 0)
+        return (
+            self._save_counter,
+            max(s.st_mtime_ns for s in stats),
+            sum(s.st_size for s in stats),
+            len(stats),
+        )
+
+    def invalidate_cache(self):
+        """显式失效（save_record 成功后调用）"""
+        self._save_counter += 1
+        self._frame_cache.clear()
+        self._transcript_cache.clear()
+
+    def load_dashboard_frame(self, start=None) -> pd.DataFrame:
+        """
+        加载主管看板用的派生表 (按 数据版本 + 起始时间 缓存)
+        同一版本只解析、派生一次；调用方应视返回值为只读
+        """
+        version = self.data_version()
+        cached = self._frame_cache.get((version, start))
+        if cached is not None:
+            return cached
+
+        df = self.load_records(compact=True, start=start)
+        if not df.empty:
+            # 向量化派生，避免逐行 apply (评分已在紧凑加载时转为整数)
+            df["成交状态"] = pd.Categorical(np.where(df["是否成交"] == "是", "✅ 成交", "⏳ 待定"))
+
+        self._frame_cache = {k: v for k, v in self._frame_cache.items() if k[0] == version}
+        self._frame_cache[(version, start)] = df
+        return df
+
+    def rebuild_rollups(self):
+        """从明细全量回填 日/周/月 × 咨询师 聚合表"""
+        with self._write_lock:
+            self.rollups.rebuild(self.load_records(compact=True))
+
+    def load_trends(self, grain: str = "week") -> pd.DataFrame:
+        """趋势分析数据：只读聚合表"""
+        return self.rollups.load_trends(grain)
+
+    def rebuild_similarity(self):
+        """从明细全量重建相似案例索引"""
+        from src.database.similarity import document_text
+
+        with self._write_lock:
+            df = self._read_all(["评分", "痛点", "摘要", "失误点", "对话实录"])
+            if df.empty:
+                self.similarity.rebuild([])
+                return
+            scores = pd.to_numeric(df["评分"], errors="coerce").fillna(0).astype(int)
+            transcripts = df["对话实录"] if "对话实录" in df.columns else [None] * len(df)
+            self.similarity.rebuild(
+                (record_id, document_text(pain, summary, bad, transcript), score)
+                for record_id, pain, summary, bad, transcript, score in zip(
+                    df.index, df["痛点"], df["摘要"], df["失误点"], transcripts, scores
+                )
+            )
+
+    def _similarity_indexes(self) -> list:
+        """本实例写入的相似索引：门店部署下为 [门店索引, 总部索引]"""
+        indexes = [self.similarity]
+        if self.store_path != self.db_path:
+            from src.database.similarity import SimilarityIndex
+
+            indexes.append(SimilarityIndex(self.db_path))
+        return indexes
+
+    def compact_similarity(self, force: bool = False) -> list:
+        """
+        为尾部达到 COMPACT_EVERY 条 (force=True 时不限) 的相似索引重新生成倒排表
+        由 backfill_similarity --compact 定时执行，不在保存记录时进行；返回已处理的索引目录
+        """
+        from src.database.similarity import COMPACT_EVERY
+
+        compacted = []
+        with self._write_lock:
+            for index in self._similarity_indexes():
+                if index.pending() and (force or index.pending() >= COMPACT_EVERY):
+                    index.compact()
+                    compacted.append(index.index_dir)
+        return compacted
+
+    def load_cases(self, record_ids) -> pd.DataFrame:
+        """
+        按记录ID读取案例概要 (不受看板时间范围限制)，返回顺序与 record_ids 一致
+        从全量看板派生表中取行 (按数据版本缓存)，重复查询不再读取明细
+        """
+        columns = ["时间", "咨询师", "患者姓名", "评分", "痛点"]
+        df = self.load_dashboard_frame()
+        if df.empty:
+            return pd.DataFrame(columns=columns)
+        ids = [int(i) for i in record_ids if int(i) in df.index]
+        return df.loc[ids, columns]
+
+    def find_similar(self, record_index: int, k: int = 5, min_score: int = None) -> list:
+        """查找与指定记录最相似的历史案例：[(记录序号, 相似度), ...]，可按最低评分过滤"""
+        return self.similarity.most_similar([int(record_index)], k=k, min_score=min_score)[int(record_index)]
+
+    def migrate_to_partitions(self) -> int:
+        """
+        把单文件主库按月拆分到分区目录，记录ID沿用原行号 (相似案例索引无需重建)
+        迁移后设置 DB_PARTITIONED=true 启用分区模式
+        """
+        if not os.path.exists(self.db_path):
+            return 0
+        # 已分配过记录ID (迁移过 / 已在分区模式下写入) 时再次迁移会产生重复ID
+        directory = self._partition_dir(self.clinic)
+        has_partitions = os.path.isdir(directory) and any(_PARTITION_FILE.match(n) for n in os.listdir(directory))
+        if has_partitions or os.path.exists(os.path.join(self.partition_root, "_sequence")):
+            raise ValueError(f"分区目录已有数据，不能重复迁移: {self.partition_root}")
+        df = pd.read_csv(self.db_path, encoding=self.encoding, dtype=TEXT_DTYPES)
+        df.insert(0, RECORD_ID, range(len(df)))
+        df = df.reindex(columns=[RECORD_ID] + DB_COLUMNS)
+        months = pd.to_datetime(df["时间"], format=TIME_FORMAT, errors="coerce").dt.strftime("%Y-%m").fillna("0000-00")
+
+        directory = self._partition_dir(self.clinic)
+        os.makedirs(directory, exist_ok=True)
+        for month, part in df.groupby(months, sort=True):
+            path = os.path.join(directory, f"{month}.csv")
+            exists = os.path.exists(path)
+            part.to_csv(path, mode="a", header=not exists, index=False, encoding=self.encoding, errors="replace")
+        self._write_sequence(len(df))
+        self.invalidate_cache()
+        return len(df)
+
+    def reencode(self, target: str = "utf-8") -> list:
+        """
+        把主库 (及分区中的 CSV) 从当前 DB_ENCODING 转为 target 编码，逐文件写临时文件后替换
+        已经是 target 编码的文件会跳过，可重复执行；完成后需设置 DB_ENCODING=<target>
+        返回转换过的文件列表
+        """
+        if self.partitioned:
+            paths = [path for path, _ in self._data_files() if path.endswith(".csv")]
+        else:
+            paths = [self.db_path] if os.path.exists(self.db_path) else []
+
+        converted = []
+        for path in paths:
+            with open(path, "rb") as f:
+                raw = f.read()
+            try:
+                raw.decode(target)
+                continue
+            except UnicodeDecodeError:
+                pass
+            # 全部按字符串读写，评分/空值等原样保留
+            df = pd.read_csv(path, encoding=self.encoding, dtype=str, keep_default_na=False)
+            tmp_path = path + ".tmp"
+            df.to_csv(tmp_path, index=False, encoding=target)
+            os.replace(tmp_path, path)
+            converted.append(path)
+        if converted:
+            self.invalidate_cache()
+        return converted
+
+    def compact_partitions(self) -> list:
+        """
+        将已结束月份的 CSV 分区归档为 Parquet (zstd 压缩、按列读取)，当月分区保持 CSV 以便追加
+        需要 pyarrow；返回生成的归档文件列表
+        """
+        if not self.partitioned:
+            raise ValueError("仅分区模式 (DB_PARTITIONED=true) 支持归档压缩")
+        if not HAS_PYARROW:
+            raise ImportError("归档压缩需要 pyarrow，请执行 pip install -r requirements.txt")
+
+        current_month = datetime.datetime.now().strftime("%Y-%m")
+        archived = []
+        for path, _ in self._data_files():
+            if not path.endswith(".csv") or os.path.basename(path)[:7] >= current_month:
+                continue
+            target = path[:-len(".csv")] + ".parquet"
+            pd.read_csv(path, encoding=self.encoding, dtype=TEXT_DTYPES).to_parquet(target, index=False, compression="zstd")
+            os.remove(path)
+            archived.append(target)
+        if archived:
+            self.invalidate_cache()
+        return archived
+
+    def export_snapshot(self, full: bool = False, fmt: str = "arrow"):
+        """
+        导出列式快照：只写入上次导出之后的新记录；full=True 时清空已有快照后全量导出
+        fmt: arrow (可内存映射) / parquet (压缩，便于外部拉取)；需要 pyarrow
+        返回新快照路径，没有新记录时返回 None
+        """
+        if not HAS_PYARROW:
+            raise ImportError("导出快照需要 pyarrow，请执行 pip install -r requirements.txt")
+        with self._write_lock:
+            if full:
+                self.snapshots.reset()
+            # 分区模式下按上次导出时间裁剪分区，增量导出只读取最近的数据
+            start = self.snapshots.manifest()["last_time"] if self.partitioned else None
+            return self.snapshots.write(self._read_all(start=start), fmt)
+
+    def load_snapshots(self, columns=None, as_pandas: bool = False):
+        """
+        读取列式快照 (内存映射)：默认返回 Arrow Table
+        as_pandas=True 时返回以 ArrowDtype 承载的 DataFrame，列数据不做拷贝
+        """
+        table = self.snapshots.load(columns)
+        return table.to_pandas(types_mapper=pd.ArrowDtype) if as_pandas else table
+
+    def load_snapshot_summary(self) -> pd.DataFrame:
+        """快照按咨询师汇总 (按 manifest 版本缓存，没有新导出时不重复读取、聚合)；没有快照时返回空表"""
+        version = self.snapshots.version()
+        cached = self._summary_cache.get(version)
+        if cached is not None:
+            return cached
+
+        table = self.load_snapshots(["咨询师", "评分", "是否成交"])
+        summary = summarize_by_consultant(table) if table.num_rows else pd.DataFrame()
+        self._summary_cache = {version: summary}
+        return summary
@@ -0,0 +1,186 @@
+import json
+import os
+import re
+from collections import Counter
+
+import pandas as pd
+
+# 聚合粒度 -> 中文名称
+GRAINS = {"day": "日", "week": "周", "month": "月"}
+ROLLUP_COLUMNS = ["周期", "咨询师", "接待量", "成交量", "评分合计", "失误点计数"]
+# 增量日志的列：保存记录时只追加一行，读取时与聚合表合并
+DELTA_COLUMNS = ["时间", "咨询师", "是否成交", "评分", "失误点"]
+# 增量日志超过该大小时并入各粒度聚合表 (并入成本摊到这一批记录上)
+FOLD_DELTA_BYTES = 256 * 1024
+
+
+def bucket_keys(times: pd.Series, grain: str) -> pd.Series:
+    """
+    把时间列映射为周期键 (向量化)
+    日: 2026-01-01 / 周: 当周周一 2025-12-29 / 月: 2026-01
+    """
+    t = pd.to_datetime(times, errors="coerce")
+    if grain == "day":
+        return t.dt.strftime("%Y-%m-%d")
+    if grain == "week":
+        return (t - pd.to_timedelta(t.dt.weekday, unit="D")).dt.strftime("%Y-%m-%d")
+    if grain == "month":
+        return t.dt.strftime("%Y-%m")
+    raise ValueError(f"未知的聚合粒度: {grain}")
+
+
+def split_findings(text) -> list:
+    """把 LLM 输出的失误点长句拆成单条，便于计数"""
+    if text is None or pd.isna(text):
+        return []
+    parts = (p.strip(" \t，,、") for p in re.split(r"[；;。\n]+", str(text)))
+    return [p for p in parts if p and p != "无"]
+
+
+def _merge_counts(values) -> str:
+    merged = Counter()
+    for value in values:
+        if isinstance(value, str) and value:
+            merged.update(json.loads(value))
+    return json.dumps(dict(merged), ensure_ascii=False)
+
+
+def aggregate(records: pd.DataFrame, grain: str) -> pd.DataFrame:
+    """明细 (时间/咨询师/是否成交/评分/失误点) -> 指定粒度的聚合表"""
+    if records.empty:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+    df = pd.DataFrame({
+        "周期": bucket_keys(records["时间"], grain),
+        "咨询师": records["咨询师"].astype(str),
+        "成交": (records["是否成交"] == "是").astype(int),
+        "评分": pd.to_numeric(records["评分"], errors="coerce").fillna(0).astype(int),
+        "失误点": records["失误点"],
+    }).dropna(subset=["周期"])
+    groups = df.groupby(["周期", "咨询师"], sort=True)
+    rollup = groups.agg(接待量=("评分", "size"), 成交量=("成交", "sum"), 评分合计=("评分", "sum"))
+    rollup["失误点计数"] = groups["失误点"].agg(
+        lambda s: json.dumps(dict(Counter(p for t in s for p in split_findings(t))), ensure_ascii=False)
+    )
+    return rollup.reset_index()[ROLLUP_COLUMNS]
+
+
+def combine(*frames: pd.DataFrame) -> pd.DataFrame:
+    """合并多张同粒度聚合表：计数相加，失误点计数按 key 累加"""
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+    if len(frames) == 1:
+        return frames[0][ROLLUP_COLUMNS]
+    groups = pd.concat(frames, ignore_index=True).groupby(["周期", "咨询师"], sort=True)
+    rollup = groups[["接待量", "成交量", "评分合计"]].sum()
+    rollup["失误点计数"] = groups["失误点计数"].agg(_merge_counts)
+    return rollup.reset_index()[ROLLUP_COLUMNS]
+
+
+class RollupStore:
+    """
+    咨询师 × 时间周期 的预聚合表
+    每个粒度一个 CSV，与主库同目录：<主库名>_rollup_<粒度>.csv
+    保存记录时只向增量日志 <主库名>_rollup_delta.csv 追加一行，读取时与聚合表合并；
+    日志超过 FOLD_DELTA_BYTES 后并入聚合表，保存成本与历史长度无关
+    历史数据通过 rebuild 回填
+    """
+
+    def __init__(self, db_path: str):
+        self.base_path = os.path.splitext(db_path)[0]
+        # 趋势数据缓存：{(粒度, 文件版本): 数据}，只保留最新一个版本
+        self._trends_cache = {}
+
+    def version(self) -> tuple:
+        """聚合表与增量日志的 (修改时间, 大小)；任一文件变化 (包括其他进程写入) 时版本随之变化"""
+        stats = []
+        for path in [self.path(g) for g in GRAINS] + [self.delta_path]:
+            try:
+                s = os.stat(path)
+                stats.append((s.st_mtime_ns, s.st_size))
+            except FileNotFoundError:
+                stats.append(None)
+        return tuple(stats)
+
+    def path(self, grain: str) -> str:
+        return f"{self.base_path}_rollup_{grain}.csv"
+
+    @property
+    def delta_path(self) -> str:
+        return f"{self.base_path}_rollup_delta.csv"
+
+    def _load_table(self, grain: str) -> pd.DataFrame:
+        path = self.path(grain)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=ROLLUP_COLUMNS)
+        return pd.read_csv(path, encoding="utf-8", dtype={"周期": str, "咨询师": str})
+
+    def _load_delta(self) -> pd.DataFrame:
+        if not os.path.exists(self.delta_path):
+            return pd.DataFrame(columns=DELTA_COLUMNS)
+        return pd.read_csv(self.delta_path, encoding="utf-8", dtype={"咨询师": str})
+
+    def load(self, grain: str) -> pd.DataFrame:
+        """聚合表 + 尚未并入的增量日志"""
+        return combine(self._load_table(grain), aggregate(self._load_delta(), grain))
+
+    def _write(self, grain: str, df: pd.DataFrame):
+        df.to_csv(self.path(grain), index=False, encoding="utf-8")
+
+    def add_record(self, timestamp: str, consultant: str, is_deal: str, score, bad_points: str):
+        """记录一条新咨询：追加到增量日志，日志过大时并入聚合表"""
+        score = pd.to_numeric(score, errors="coerce")
+        row = {
+            "时间": timestamp,
+            "咨询师": consultant,
+            "是否成交": is_deal,
+            "评分": 0 if pd.isna(score) else int(score),
+            "失误点": bad_points,
+        }
+        exists = os.path.exists(self.delta_path)
+        pd.DataFrame([row], columns=DELTA_COLUMNS).to_csv(
+            self.delta_path, mode="a", header=not exists, index=False, encoding="utf-8"
+        )
+        if os.path.getsize(self.delta_path) > FOLD_DELTA_BYTES:
+            self.fold()
+
+    def fold(self):
+        """把增量日志并入各粒度聚合表，然后清空日志"""
+        delta = self._load_delta()
+        if not delta.empty:
+            for grain in GRAINS:
+                self._write(grain, combine(self._load_table(grain), aggregate(delta, grain)))
+        if os.path.exists(self.delta_path):
+            os.remove(self.delta_path)
+
+    def rebuild(self, records: pd.DataFrame):
+        """从全量记录重建所有粒度的聚合表 (回填 / 修复用)，同时清空增量日志"""
+        for grain in GRAINS:
+            self._write(grain, aggregate(records, grain))
+        if os.path.exists(self.delta_path):
+            os.remove(self.delta_path)
+
+    def load_trends(self, grain: str) -> pd.DataFrame:
+        """
+        读取聚合表并派生 平均分 / 成交率 / 高频失误点 (只读聚合表，不扫描明细)
+        按 粒度 + 文件版本 缓存，看板每次重跑时文件未变化则直接复用；调用方应视返回值为只读
+        """
+        version = self.version()
+        cached = self._trends_cache.get((grain, version))
+        if cached is not None:
+            return cached
+
+        df = self.load(grain)
+        if not df.empty:
+            df["平均分"] = (df["评分合计"] / df["接待量"]).round(1)
+            df["成交率"] = (df["成交量"] / df["接待量"] * 100).round(1)
+            df["高频失误点"] = [
+                Counter(json.loads(c)).most_common(1)[0][0] if isinstance(c, str) and c not in ("", "{}") else ""
+                for c in df["失误点计数"]
+            ]
+            df = df.sort_values(["周期", "咨询师"]).reset_index(drop=True)
+
+        self._trends_cache = {k: v for k, v in self._trends_cache.items() if k[1] == version}
+        self._trends_cache[(grain, version)] = df
+        return df
+
@@ -0,0 +1,246 @@
+import os
+import re
+import shutil
+import zlib
+from collections import Counter
+
+import numpy as np
+import scipy.sparse as sp
+
+# 特征哈希空间：字符 n-gram 经 crc32 映射到固定维度，无需维护词表
+N_FEATURES = 1 << 18
+NGRAM_RANGE = (2, 3)
+# 每篇文档只保留权重最高的若干特征，控制索引体积与查询开销
+MAX_TERMS = 256
+# 对话实录只取开头一段参与索引，痛点/摘要/失误点全文参与
+TRANSCRIPT_CHARS = 800
+# 增量尾部达到该条数时，backfill_similarity --compact 才重新生成倒排表 (保存记录时不做)
+COMPACT_EVERY = 2000
+
+_SPEAKER_TAG = re.compile(r"【[^】]*】\s*[:：]?")
+_WHITESPACE = re.compile(r"\s+")
+
+# 索引文件 -> dtype，均为按需内存映射的裸二进制数组
+INDEX_FILES = {
+    # 正排 (文档 × 特征 CSR)：可追加写入
+    "data": np.float32,
+    "indices": np.int32,
+    "indptr": np.int32,
+    "records": np.int64,
+    "scores": np.int16,
+    "doc_freq": np.int32,
+    # 倒排 (特征 × 文档 CSR)：覆盖前 posting_docs 条文档，查询只访问命中特征的倒排链
+    "posting_data": np.float32,
+    "posting_indices": np.int32,
+    "posting_indptr": np.int32,
+    "posting_docs": np.int64,
+}
+
+
+def document_text(pain_points, summary, bad_points, transcript) -> str:
+    """拼接参与相似度计算的文本；痛点重复一次以提高权重"""
+    transcript = _SPEAKER_TAG.sub("", transcript)[:TRANSCRIPT_CHARS] if isinstance(transcript, str) else ""
+    parts = [pain_points, pain_points, summary, bad_points, transcript]
+    return "\n".join(p for p in parts if isinstance(p, str) and p)
+
+
+def hashed_ngrams(text: str) -> Counter:
+    """字符 n-gram 词频 (特征为哈希桶编号)"""
+    text = _WHITESPACE.sub(" ", text)
+    counts = Counter()
+    for n in range(NGRAM_RANGE[0], NGRAM_RANGE[1] + 1):
+        counts.update(
+            zlib.crc32(text[i:i + n].encode("utf-8")) & (N_FEATURES - 1)
+            for i in range(len(text) - n + 1)
+        )
+    return counts
+
+
+def _vectorize(counts: Counter, doc_freq: np.ndarray, n_docs: int):
+    """sublinear TF × 平滑 IDF，截断到 MAX_TERMS 后做 L2 归一化"""
+    if not counts:
+        return np.zeros(0, np.int32), np.zeros(0, np.float32)
+    idx = np.fromiter(counts.keys(), np.int32, len(counts))
+    tf = np.fromiter(counts.values(), np.float32, len(counts))
+    idf = np.log((1 + n_docs) / (1 + doc_freq[idx])) + 1
+    weights = (1 + np.log(tf)) * idf
+    if len(idx) > MAX_TERMS:
+        keep = np.argpartition(weights, -MAX_TERMS)[-MAX_TERMS:]
+        idx, weights = idx[keep], weights[keep]
+    order = np.argsort(idx)
+    idx, weights = idx[order], weights[order]
+    weights /= np.linalg.norm(weights)
+    return idx, weights.astype(np.float32)
+
+
+class SimilarityIndex:
+    """
+    咨询记录相似度索引 (本地计算，不依赖外部服务)
+    目录：<主库名>_similarity/，CSR 矩阵的各数组分文件存储，查询时内存映射
+    新记录追加到正排尾部，查询时 倒排表 + 尾部直接扫描；倒排表由定时任务 compact 更新
+    增量添加时使用当时的文档频率计算 IDF；rebuild 会按最终 IDF 重算全部向量
+    """
+
+    def __init__(self, db_path: str):
+        self.index_dir = os.path.splitext(db_path)[0] + "_similarity"
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.index_dir, f"{name}.bin")
+
+    def _open(self, name: str, mode: str = "r") -> np.ndarray:
+        path = self._path(name)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return np.zeros(0, INDEX_FILES[name])
+        return np.memmap(path, dtype=INDEX_FILES[name], mode=mode)
+
+    def _append(self, name: str, values):
+        with open(self._path(name), "ab") as f:
+            f.write(np.asarray(values, dtype=INDEX_FILES[name]).tobytes())
+
+    def __len__(self) -> int:
+        return len(self._open("records"))
+
+    def add(self, record_index: int, text: str, score: int):
+        """追加一条记录 (save_record 时调用)：只追加正排，耗时与索引规模无关"""
+        os.makedirs(self.index_dir, exist_ok=True)
+        if not os.path.exists(self._path("doc_freq")):
+            np.zeros(N_FEATURES, np.int32).tofile(self._path("doc_freq"))
+
+        counts = hashed_ngrams(text)
+        doc_freq = self._open("doc_freq", mode="r+")
+        doc_freq[np.fromiter(counts.keys(), np.int32, len(counts))] += 1
+        doc_freq.flush()
+
+        n_docs = len(self)
+        idx, weights = _vectorize(counts, doc_freq, n_docs + 1)
+        indptr = self._open("indptr")
+        if len(indptr) == 0:
+            self._append("indptr", [0])
+            last = 0
+        else:
+            last = int(indptr[-1])
+
+        # records 最后写入：它的长度决定索引中的文档数
+        self._append("data", weights)
+        self._append("indices", idx)
+        self._append("scores", [score])
+        self._append("indptr", [last + len(idx)])
+        self._append("records", [record_index])
+
+    def rebuild(self, docs):
+        """从 (记录序号, 文本, 评分) 序列全量重建索引"""
+        docs = list(docs)
+        if os.path.exists(self.index_dir):
+            shutil.rmtree(self.index_dir)
+        os.makedirs(self.index_dir)
+
+        # 两遍扫描：第一遍只统计文档频率，第二遍按最终 IDF 向量化并直接写盘，
+        # 避免同时持有全部文档的词频表
+        doc_freq = np.zeros(N_FEATURES, np.int32)
+        for _, text, _ in docs:
+            counts = hashed_ngrams(text)
+            doc_freq[np.fromiter(counts.keys(), np.int32, len(counts))] += 1
+
+        lengths = []
+        with open(self._path("data"), "wb") as data, open(self._path("indices"), "wb") as indices:
+            for _, text, _ in docs:
+                idx, weights = _vectorize(hashed_ngrams(text), doc_freq, len(docs))
+                data.write(weights.tobytes())
+                indices.write(idx.tobytes())
+                lengths.append(len(idx))
+
+        arrays = {
+            "indptr": np.concatenate([[0], np.cumsum(lengths)]),
+            "scores": [score for _, _, score in docs],
+            "doc_freq": doc_freq,
+            "records": [record for record, _, _ in docs],
+        }
+        for name, values in arrays.items():
+            np.asarray(values, dtype=INDEX_FILES[name]).tofile(self._path(name))
+        self.compact()
+
+    def compact(self):
+        """由正排转置生成倒排表，覆盖当前全部文档"""
+        matrix = self._matrix()
+        if matrix is None:
+            return
+        postings = matrix.T.tocsr()
+        for name, values in (
+            ("posting_data", postings.data),
+            ("posting_indices", postings.indices),
+            ("posting_indptr", postings.indptr),
+            ("posting_docs", [matrix.shape[0]]),
+        ):
+            np.asarray(values, dtype=INDEX_FILES[name]).tofile(self._path(name))
+
+    def _posting_docs(self) -> int:
+        docs = self._open("posting_docs")
+        return int(docs[0]) if len(docs) else 0
+
+    def pending(self) -> int:
+        """尚未进入倒排表、查询时需要直接扫描的尾部文档数"""
+        return len(self) - self._posting_docs()
+
+    def _scores(self, queries: sp.csr_matrix) -> np.ndarray:
+        """查询向量与全部文档的点积：倒排覆盖部分 + 正排尾部"""
+        n_docs, base = len(self), self._posting_docs()
+        sims = np.zeros((queries.shape[0], n_docs), np.float32)
+        if base:
+            postings = sp.csr_matrix(
+                (self._open("posting_data"), self._open("posting_indices"), self._open("posting_indptr")),
+                shape=(N_FEATURES, base),
+                copy=False,
+            )
+            sims[:, :base] = (queries @ postings).toarray()
+        if n_docs > base:
+            tail = self._matrix()[base:n_docs]
+            sims[:, base:] = (queries @ tail.T).toarray()
+        return sims
+
+    def _matrix(self):
+        n_docs = len(self)
+        if n_docs == 0:
+            return None
+        return sp.csr_matrix(
+            (self._open("data"), self._open("indices"), self._open("indptr")[:n_docs + 1]),
+            shape=(n_docs, N_FEATURES),
+            copy=False,
+        )
+
+    def _top_k(self, queries: sp.csr_matrix, k: int, exclude=None, min_score=None) -> list:
+        """批量余弦相似度 top-k (向量均已 L2 归一化，点积即余弦)"""
+        matrix = self._matrix()
+        if matrix is None:
+            return [[] for _ in range(queries.shape[0])]
+
+        records = np.asarray(self._open("records"))
+        sims = self._scores(queries)
+        if min_score is not None:
+            sims[:, np.asarray(self._open("scores")) < min_score] = 0
+        if exclude is not None:
+            for row, record in enumerate(exclude):
+                sims[row, records == record] = 0
+
+        results = []
+        k = min(k, sims.shape[1])
+        for row in sims:
+            top = np.argpartition(row, -k)[-k:]
+            top = top[np.argsort(row[top])[::-1]]
+            results.append([(int(records[i]), float(row[i])) for i in top if row[i] > 0])
+        return results
+
+    def most_similar(self, record_indices, k: int = 5, min_score: int = None) -> dict:
+        """按记录序号批量查询相似记录：{记录序号: [(相似记录序号, 余弦相似度), ...]}"""
+        matrix = self._matrix()
+        if matrix is None:
+            return {record: [] for record in record_indices}
+
+        records = np.asarray(self._open("records"))
+        positions = {record: np.flatnonzero(records == record) for record in record_indices}
+        found = [record for record, pos in positions.items() if len(pos)]
+        results = {record: [] for record in record_indices}
+        if found:
+            queries = matrix[[int(positions[record][-1]) for record in found]]
+            for record, hits in zip(found, self._top_k(queries, k, exclude=found, min_score=min_score)):
+                results[record] = hits
+        return results
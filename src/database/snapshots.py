@@ -0,0 +1,216 @@
+import datetime
+import json
+import os
+import shutil
+
+import pandas as pd
+
+from src.core.models import ConsultationReport
+
+# 快照结构版本：字段增删或类型变化时递增，BI 侧据此判断兼容性
+# 2: 新增 门店 (可空)
+SCHEMA_VERSION = 2
+# ConsultationReport 字段 -> 主库列名
+REPORT_COLUMNS = {
+    "summary": "摘要",
+    "customer_intent": "客户意向",
+    "sales_score": "评分",
+    "pain_points": "痛点",
+    "good_points": "优点",
+    "bad_points": "失误点",
+    "next_step": "下一步建议",
+}
+# 低基数字段用字典编码
+DICTIONARY_COLUMNS = {"咨询师", "是否成交", "客户意向", "门店"}
+TIME_FORMAT = "%Y-%m-%d %H:%M"
+
+
+def snapshot_schema():
+    """
+    快照的 Arrow schema：记录元数据 + ConsultationReport 字段 (按模型顺序) + 对话实录
+    每个字段的 metadata 记录模型字段名与说明，列顺序与类型保持稳定
+    """
+    import pyarrow as pa
+
+    def column(name, key, arrow_type, description):
+        if name in DICTIONARY_COLUMNS:
+            arrow_type = pa.dictionary(pa.int32(), arrow_type)
+        return pa.field(name, arrow_type, metadata={"field": key, "description": description})
+
+    fields = [
+        column("记录ID", "record_id", pa.int64(), "记录ID (单文件模式下为行号)"),
+        column("时间", "consulted_at", pa.timestamp("ms"), "咨询时间"),
+        column("咨询师", "consultant", pa.string(), "咨询师"),
+        column("患者姓名", "patient", pa.string(), "患者姓名"),
+        column("是否成交", "is_deal", pa.string(), "是否成交: 是/否"),
+        column("门店", "clinic", pa.string(), "门店 (未按门店分区的记录为空)"),
+    ]
+    for key, info in ConsultationReport.model_fields.items():
+        arrow_type = pa.int16() if info.annotation is int else pa.string()
+        fields.append(column(REPORT_COLUMNS[key], key, arrow_type, info.description or ""))
+    fields.append(column("对话实录", "transcript", pa.string(), "对话实录"))
+    return pa.schema(fields, metadata={"schema_version": str(SCHEMA_VERSION)})
+
+
+def conform_table(table, schema):
+    """按 schema 选取并排列列；旧版本快照缺少的列 (如 v1 的 门店) 补空值"""
+    import pyarrow as pa
+
+    arrays = [
+        table[field.name] if field.name in table.column_names else pa.nulls(table.num_rows, field.type)
+        for field in schema
+    ]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def to_arrow_table(df: pd.DataFrame):
+    """主库记录 (索引为记录ID) -> 符合 snapshot_schema 的 Arrow Table"""
+    import pyarrow as pa
+
+    schema = snapshot_schema()
+    arrays = []
+    for field in schema:
+        if field.name == "记录ID":
+            values = pd.Series(df.index, dtype="int64")
+        elif field.name not in df.columns:
+            values = pd.Series([None] * len(df), dtype="object")
+        else:
+            values = df[field.name].reset_index(drop=True)
+
+        if pa.types.is_timestamp(field.type):
+            times = pd.to_datetime(values, format=TIME_FORMAT, errors="coerce")
+            arrays.append(pa.array(times.astype("datetime64[ms]"), type=field.type, from_pandas=True))
+        elif pa.types.is_integer(field.type):
+            numbers = pd.to_numeric(values, errors="coerce").astype("Int64")
+            arrays.append(pa.array(numbers, type=field.type, from_pandas=True))
+        else:
+            strings = values.astype("string")
+            value_type = field.type.value_type if pa.types.is_dictionary(field.type) else field.type
+            array = pa.array(strings, type=value_type, from_pandas=True)
+            arrays.append(array.dictionary_encode() if pa.types.is_dictionary(field.type) else array)
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class SnapshotStore:
+    """
+    供 BI / 看板分析使用的列式快照
+    目录：<主库名>_snapshots/，每次导出只写入上次之后的新记录，manifest.json 记录导出进度
+    arrow 格式 (Arrow IPC) 可内存映射零拷贝读取；parquet 格式体积更小，便于外部系统拉取
+    """
+
+    def __init__(self, db_path: str):
+        self.snapshot_dir = os.path.splitext(db_path)[0] + "_snapshots"
+        self.manifest_path = os.path.join(self.snapshot_dir, "manifest.json")
+
+    def manifest(self) -> dict:
+        if not os.path.exists(self.manifest_path):
+            return {"schema_version": SCHEMA_VERSION, "last_record_id": -1, "last_time": None, "files": []}
+        with open(self.manifest_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def version(self) -> tuple:
+        """manifest 的 (修改时间, 大小)：每次导出/重置都会改写 manifest，可作为快照集合的版本号"""
+        try:
+            s = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return (0, 0)
+        return (s.st_mtime_ns, s.st_size)
+
+    def _write_manifest(self, manifest: dict):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def reset(self):
+        if os.path.exists(self.snapshot_dir):
+            shutil.rmtree(self.snapshot_dir)
+
+    def write(self, df: pd.DataFrame, fmt: str = "arrow"):
+        """
+        把 记录ID 大于上次导出进度的记录写成新的快照文件
+        返回新文件路径；没有新记录时返回 None
+        """
+        import pyarrow as pa
+
+        if fmt not in ("arrow", "parquet"):
+            raise ValueError(f"不支持的快照格式: {fmt}")
+        manifest = self.manifest()
+        df = df[df.index > manifest["last_record_id"]].sort_index()
+        if df.empty:
+            return None
+
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        table = to_arrow_table(df)
+        name = f"snapshot_{len(manifest['files']):05d}.{fmt}"
+        path = os.path.join(self.snapshot_dir, name)
+        tmp_path = path + ".tmp"
+        if fmt == "arrow":
+            with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        else:
+            import pyarrow.parquet as pq
+
+            pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+
+        manifest["files"].append({
+            "file": name,
+            "rows": table.num_rows,
+            "min_record_id": int(df.index.min()),
+            "max_record_id": int(df.index.max()),
+            "schema_version": SCHEMA_VERSION,
+            "created_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        })
+        manifest["last_record_id"] = int(df.index.max())
+        manifest["schema_version"] = SCHEMA_VERSION
+        latest = pd.to_datetime(df["时间"], format=TIME_FORMAT, errors="coerce").max()
+        if not pd.isna(latest):
+            manifest["last_time"] = latest.strftime(TIME_FORMAT)
+        self._write_manifest(manifest)
+        return path
+
+    def load(self, columns=None):
+        """
+        读取全部快照为一个 Arrow Table (多个 chunk，不做合并拷贝)
+        arrow 文件通过内存映射零拷贝读取；parquet 文件按列读取
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = snapshot_schema()
+        if columns:
+            schema = pa.schema([schema.field(c) for c in columns])
+        tables = []
+        for entry in self.manifest()["files"]:
+            path = os.path.join(self.snapshot_dir, entry["file"])
+            if path.endswith(".arrow"):
+                table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+            else:
+                present = set(pq.read_schema(path).names)
+                table = pq.read_table(path, columns=[c for c in schema.names if c in present], memory_map=True)
+            tables.append(conform_table(table, schema))
+        if not tables:
+            return schema.empty_table()
+        # 每个快照文件各有一份字典，合并后统一字典，否则 group_by 等计算无法处理
+        return pa.concat_tables(tables).unify_dictionaries()
+
+
+def summarize_by_consultant(table):
+    """快照按咨询师聚合：接待量 / 平均分 / 成交率 (%)，计算在 Arrow 上完成，只把结果转为 pandas"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    deal = pc.cast(pc.equal(table["是否成交"].cast(pa.string()), "是"), pa.int8())
+    summary = (
+        table.select(["咨询师", "评分"])
+        .append_column("成交", deal)
+        .group_by("咨询师")
+        .aggregate([("评分", "count"), ("评分", "mean"), ("成交", "mean")])
+        .to_pandas()
+        .rename(columns={"评分_count": "接待量", "评分_mean": "平均分", "成交_mean": "成交率"})
+    )
+    summary["咨询师"] = summary["咨询师"].astype(str)
+    summary["平均分"] = summary["平均分"].round(1)
+    summary["成交率"] = (summary["成交率"] * 100).round(1)
+    return summary[["咨询师", "接待量", "平均分", "成交率"]].sort_values("接待量", ascending=False)
@@ -2,6 +2,7 @@ import streamlit as st
 import sys
 import os
 import time
+import datetime
 import asyncio
 import pandas as pd
 
@@ -10,7 +11,9 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")
 
 from src.core.llm_engine import AnalysisEngine
 from src.core.asr_client import ASRClient
-from src.database.repository import ConsultationRepository
+from src.database.repository import ConsultationRepository, HAS_PYARROW
+from src.database.rollups import GRAINS
+from src.ui.dialogue import DIALOGUE_PAGE_SIZE, parse_dialogue, page_count, page_of_turn, build_dialogue_html
 from config.settings import settings
 
 # ================= CSS 美化 =================
@@ -40,38 +43,99 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ================= 服务初始化 =================
-if 'services' not in st.session_state:
-    st.session_state.services = {
-        'db': ConsultationRepository(),
-        'analyst': AnalysisEngine(),
-        'asr': ASRClient()
-    }
-services = st.session_state.services
+# 懒加载 + 进程内共享：首次用到时才构建，所有会话复用同一实例
+@st.cache_resource(show_spinner=False)
+def get_repository() -> ConsultationRepository:
+    return ConsultationRepository()
+
+@st.cache_resource(show_spinner=False)
+def get_analyst() -> AnalysisEngine:
+    return AnalysisEngine()
+
+@st.cache_resource(show_spinner=False)
+def get_asr() -> ASRClient:
+    return ASRClient()
 
 # ================= 辅助函数 =================
-def render_dialogue(text):
-    """渲染气泡对话"""
+# 看板时间范围 -> 回溯天数 (None 为全部)；分区存储下只读取范围内的月份
+TIME_RANGES = {"近7天": 7, "近30天": 30, "近90天": 90, "全部": None}
+
+def render_dialogue(text, key="dialogue"):
+    """渲染气泡对话：单页一次性输出，长录音分页 + 跳转到指定轮次"""
     if not text or pd.isna(text) or str(text) == "nan":
         st.info("暂无对话记录")
         return
-    text = str(text)
-    
-    # 模拟数据通常自带换行，ASR数据可能需要处理
-    lines = text.split('\n')
-    for line in lines:
-        line = line.strip()
-        if not line: continue
-        
-        # 简单规则：默认说话人0是咨询师
-        is_doctor = "说话人 0" in line or "咨询师" in line
-        content = line.split("】")[-1].replace(":", "").strip() if "】" in line else line
-        
-        if is_doctor:
-            st.markdown(f"<div><span class='speaker-label'>咨询师</span><div class='chat-doctor'>{content}</div></div>", unsafe_allow_html=True)
-        else:
-            st.markdown(f"<div style='text-align:right'><span class='speaker-label'>患者</span><div class='chat-patient'>{content}</div></div>", unsafe_allow_html=True)
-    
-    st.markdown("<div style='clear:both'></div>", unsafe_allow_html=True)
+
+    turns = parse_dialogue(str(text))
+    if not turns:
+        st.info("暂无对话记录")
+        return
+
+    total = len(turns)
+    pages = page_count(total)
+    page = 1
+    if pages > 1:
+        page_key = f"{key}_page"
+
+        def _jump():
+            st.session_state[page_key] = page_of_turn(st.session_state[f"{key}_jump"])
+
+        c1, c2 = st.columns(2)
+        page = c1.number_input(f"页码 (共 {pages} 页)", min_value=1, max_value=pages, step=1, key=page_key)
+        c2.number_input("跳转到第几轮", min_value=1, max_value=total, step=1, key=f"{key}_jump", on_change=_jump)
+
+    start = (page - 1) * DIALOGUE_PAGE_SIZE
+    window = turns[start:start + DIALOGUE_PAGE_SIZE]
+    if pages > 1:
+        st.caption(f"第 {start + 1}–{start + len(window)} 轮 / 共 {total} 轮")
+    st.markdown(build_dialogue_html(window, start), unsafe_allow_html=True)
+
+def render_trends():
+    """趋势分析：只读预聚合表 (日/周/月 × 咨询师)，按文件版本缓存，不扫描明细"""
+    grain_label = st.radio("统计粒度", list(GRAINS.values()), index=1, horizontal=True)
+    grain = {label: g for g, label in GRAINS.items()}[grain_label]
+
+    trends = get_repository().load_trends(grain)
+    if trends.empty:
+        st.info("暂无聚合数据，可运行 `python -m src.database.backfill_rollups` 从历史记录回填。")
+        return
+
+    consultants = sorted(trends["咨询师"].unique())
+    picked = st.multiselect("咨询师", consultants, default=consultants)
+    trends = trends[trends["咨询师"].isin(picked)]
+
+    c1, c2 = st.columns(2)
+    with c1:
+        st.markdown("#### 📈 平均话术分")
+        st.line_chart(trends.pivot(index="周期", columns="咨询师", values="平均分"))
+    with c2:
+        st.markdown("#### 💰 成交率 (%)")
+        st.line_chart(trends.pivot(index="周期", columns="咨询师", values="成交率"))
+
+    st.dataframe(
+        trends[["周期", "咨询师", "接待量", "平均分", "成交率", "高频失误点"]].sort_values("周期", ascending=False),
+        use_container_width=True,
+        hide_index=True,
+    )
+
+def render_snapshot_summary():
+    """全量快照分析：内存映射读取列式快照，直接在 Arrow 上聚合，不转换为 pandas 明细"""
+    repo = get_repository()
+    st.markdown("#### 📦 全量快照分析")
+    c1, c2 = st.columns([5, 1])
+    with c2:
+        if st.button("📤 增量导出", use_container_width=True):
+            path = repo.export_snapshot()
+            st.toast(f"快照已导出: {path}" if path else "没有新记录需要导出")
+    manifest = repo.snapshots.manifest()
+    c1.caption(f"已导出 {sum(f['rows'] for f in manifest['files'])} 条，数据截至 {manifest['last_time'] or '—'}")
+
+    summary = repo.load_snapshot_summary()
+    if summary.empty:
+        st.info("暂无快照，可点击「增量导出」或运行 `python -m src.database.export_snapshot`。")
+        return
+
+    st.dataframe(summary, use_container_width=True, hide_index=True)
 
 # ================= 主程序 =================
 def main():
@@ -119,8 +183,8 @@ def main():
                 else:
                     status.write("☁️ [真实模式] 上传 OSS 并转写...")
                     file_bytes = uploaded_file.getvalue()
-                    url = services['asr'].upload_to_oss(file_bytes, uploaded_file.name)
-                    transcript = services['asr'].transcribe(url)
+                    url = get_asr().upload_to_oss(file_bytes, uploaded_file.name)
+                    transcript = get_asr().transcribe(url)
 
                 # 【防御性编程】检查文本是否为空
                 if not transcript or len(transcript) < 5:
@@ -130,144 +194,180 @@ def main():
 
                 # 2. 智能分析
                 status.write("🧠 AI 正在分析销售逻辑...")
-                report = services['analyst'].analyze_consultation(transcript)
+                report = get_analyst().analyze_consultation(transcript)
                 
                 # 3. 存库 (带对话实录)
                 status.write("💾 保存至数据库...")
-                services['db'].save_record(c_name, p_name, is_deal, report, transcript)
+                get_repository().save_record(c_name, p_name, is_deal, report, transcript)
                 
                 status.update(label="✅ 完成！", state="complete", expanded=False)
-                
-                # 结果展示
-                c1, c2, c3, c4 = st.columns(4)
-                c1.metric("得分", report.sales_score)
-                c2.metric("意向", report.customer_intent)
-                c3.info(f"建议: {report.next_step}")
-                
-                t1, t2 = st.tabs(["💡 诊断报告", "📝 对话实录"])
-                with t1:
-                    st.success(f"优点：{report.good_points}")
-                    st.error(f"失误：{report.bad_points}")
-                with t2:
-                    render_dialogue(transcript)
+
+                # 结果存入会话状态：翻页/跳转触发重跑时按钮为 False，结果仍需保留
+                st.session_state["live_result"] = (report, transcript)
+                for key in ("live_page", "live_jump"):
+                    st.session_state.pop(key, None)
 
             except Exception as e:
                 status.update(label="❌ 系统错误", state="error")
                 st.error(f"Error: {str(e)}")
 
+        # 结果展示 (最近一次分析)
+        if "live_result" in st.session_state:
+            report, transcript = st.session_state["live_result"]
+            c1, c2, c3, c4 = st.columns(4)
+            c1.metric("得分", report.sales_score)
+            c2.metric("意向", report.customer_intent)
+            c3.info(f"建议: {report.next_step}")
+
+            t1, t2 = st.tabs(["💡 诊断报告", "📝 对话实录"])
+            with t1:
+                st.success(f"优点：{report.good_points}")
+                st.error(f"失误：{report.bad_points}")
+            with t2:
+                render_dialogue(transcript, key="live")
+
     # --- 主管端 (全能重构版) ---
     elif role == "📊 主管监管端":
         st.markdown("## 📊 全局监管看板")
         
         # 顶部工具栏
-        col_tool1, col_tool2 = st.columns([6, 1])
+        col_tool1, col_range, col_tool2 = st.columns([4, 2, 1])
         with col_tool1:
             st.caption(f"数据最后更新: {time.strftime('%H:%M:%S')}")
+        with col_range:
+            # 分区存储下默认只看近30天 (只读取相关月份)；单文件模式读取成本与范围无关，默认显示全部
+            default_range = list(TIME_RANGES).index("近30天" if settings.DB_PARTITIONED else "全部")
+            days = TIME_RANGES[st.selectbox("时间范围", list(TIME_RANGES), index=default_range, label_visibility="collapsed")]
+            start = (datetime.date.today() - datetime.timedelta(days=days)).isoformat() if days else None
         with col_tool2:
             if st.button("🔄 刷新", use_container_width=True):
                 st.rerun()
             
-        df = services['db'].load_records()
+        tab_board, tab_trend = st.tabs(["📋 监管看板", "📈 趋势分析"])
+
+        with tab_board:
+            # 按数据版本缓存的派生表（评分/成交状态已在仓库层向量化处理），只读
+            df = get_repository().load_dashboard_frame(start=start)
         
-        if not df.empty:
-            # 数据预处理
-            df["评分"] = pd.to_numeric(df["评分"], errors='coerce').fillna(0).astype(int)
-            df["成交状态"] = df["是否成交"].apply(lambda x: "✅ 成交" if x == "是" else "⏳ 待定")
-            
-            # --- 1. 核心指标卡 (KPI Cards) ---
-            k1, k2, k3, k4 = st.columns(4)
-            k1.metric("总接待量", f"{len(df)}", delta="今日")
+            if not df.empty:
+                # --- 1. 核心指标卡 (KPI Cards) ---
+                k1, k2, k3, k4 = st.columns(4)
+                k1.metric("总接待量", f"{len(df)}", delta="今日")
             
-            deal_rate = (len(df[df['是否成交']=='是']) / len(df) * 100)
-            k2.metric("成交率", f"{deal_rate:.1f}%", delta_color="normal" if deal_rate > 30 else "inverse")
+                deal_rate = (len(df[df['是否成交']=='是']) / len(df) * 100)
+                k2.metric("成交率", f"{deal_rate:.1f}%", delta_color="normal" if deal_rate > 30 else "inverse")
             
-            avg_score = df['评分'].mean()
-            k3.metric("平均话术分", f"{avg_score:.1f}", delta=f"{avg_score-80:.1f} vs基准")
+                avg_score = df['评分'].mean()
+                k3.metric("平均话术分", f"{avg_score:.1f}", delta=f"{avg_score-80:.1f} vs基准")
             
-            low_score_count = len(df[df['评分'] < 60])
-            k4.metric("高危预警", f"{low_score_count} 单", delta="需复盘", delta_color="inverse")
+                low_score_count = len(df[df['评分'] < 60])
+                k4.metric("高危预警", f"{low_score_count} 单", delta="需复盘", delta_color="inverse")
             
-            st.divider()
+                st.divider()
             
-            # --- 2. 交互式数据表格 (Data Grid) ---
-            st.subheader("📋 咨询记录检索")
+                # --- 2. 交互式数据表格 (Data Grid) ---
+                st.subheader("📋 咨询记录检索")
             
-            # 使用 data_editor 代替简单的 dataframe，支持排序和筛选
-            # 仅展示关键字段
-            grid_df = df[["时间", "咨询师", "患者姓名", "评分", "成交状态", "客户意向"]]
+                # 使用 data_editor 代替简单的 dataframe，支持排序和筛选
+                # 仅展示关键字段
+                grid_cols = ["时间", "咨询师", "患者姓名", "评分", "成交状态", "客户意向"]
+                grid_df = df[grid_cols + (["门店"] if "门店" in df.columns else [])]
             
-            selection = st.dataframe(
-                grid_df,
-                use_container_width=True,
-                hide_index=True,
-                column_config={
-                    "评分": st.column_config.ProgressColumn(
-                        "AI评分", min_value=0, max_value=100, format="%d 分"
-                    ),
-                    "成交状态": st.column_config.TextColumn("状态", width="small"),
-                    "客户意向": st.column_config.TextColumn("意向", width="small"),
-                },
-                selection_mode="single-row",
-                on_select="rerun" # 选中行时自动刷新
-            )
+                selection = st.dataframe(
+                    grid_df,
+                    use_container_width=True,
+                    hide_index=True,
+                    column_config={
+                        "时间": st.column_config.DatetimeColumn("时间", format="YYYY-MM-DD HH:mm"),
+                        "评分": st.column_config.ProgressColumn(
+                            "AI评分", min_value=0, max_value=100, format="%d 分"
+                        ),
+                        "成交状态": st.column_config.TextColumn("状态", width="small"),
+                        "客户意向": st.column_config.TextColumn("意向", width="small"),
+                    },
+                    selection_mode="single-row",
+                    on_select="rerun" # 选中行时自动刷新
+                )
             
-            # 获取选中行的索引
-            selected_rows = selection.selection.rows
+                # 获取选中行的索引
+                selected_rows = selection.selection.rows
             
-            st.divider()
+                st.divider()
             
-            # --- 3. 详情透视区 (Deep Dive) ---
-            if selected_rows:
-                # 获取选中行的数据
-                selected_index = selected_rows[0]
-                row = df.iloc[selected_index]
+                # --- 3. 详情透视区 (Deep Dive) ---
+                if selected_rows:
+                    # 获取选中行的数据
+                    selected_index = selected_rows[0]
+                    row = df.iloc[selected_index]
                 
-                st.subheader(f"🔎 深度复盘：{row.get('患者姓名', '未知')}")
+                    st.subheader(f"🔎 深度复盘：{row.get('患者姓名', '未知')}")
                 
-                # 详情页布局：左侧诊断，右侧证据
-                d_col1, d_col2 = st.columns([1, 1], gap="large")
+                    # 详情页布局：左侧诊断，右侧证据
+                    d_col1, d_col2 = st.columns([1, 1], gap="large")
                 
-                with d_col1:
-                    # 头部信息卡
-                    with st.container(border=True):
-                        c1, c2, c3 = st.columns(3)
-                        c1.markdown(f"**咨询师**\n\n{row['咨询师']}")
-                        score_color = "green" if row['评分'] >= 80 else "red"
-                        c2.markdown(f"**AI评分**\n\n:{score_color}[**{row['评分']}**]")
-                        c3.markdown(f"**成交状态**\n\n{row['成交状态']}")
+                    with d_col1:
+                        # 头部信息卡
+                        with st.container(border=True):
+                            c1, c2, c3 = st.columns(3)
+                            c1.markdown(f"**咨询师**\n\n{row['咨询师']}")
+                            score_color = "green" if row['评分'] >= 80 else "red"
+                            c2.markdown(f"**AI评分**\n\n:{score_color}[**{row['评分']}**]")
+                            c3.markdown(f"**成交状态**\n\n{row['成交状态']}")
                     
-                    # 诊断内容
-                    st.markdown("### 🩺 AI 诊断")
-                    with st.expander("🎯 客户核心画像", expanded=True):
-                        st.markdown(f"**痛点**：{row['痛点']}")
-                        st.markdown(f"**意向**：{row['客户意向']}")
+                        # 诊断内容
+                        st.markdown("### 🩺 AI 诊断")
+                        with st.expander("🎯 客户核心画像", expanded=True):
+                            st.markdown(f"**痛点**：{row['痛点']}")
+                            st.markdown(f"**意向**：{row['客户意向']}")
                         
-                    with st.expander("💡 话术优劣势分析", expanded=True):
-                        st.success(f"**做得好的**：\n{row['优点']}")
-                        st.error(f"**致命失误**：\n{row['失误点']}")
-                        st.info(f"**改进建议**：\n{row['下一步建议']}")
-
-                with d_col2:
-                    st.markdown("### 📝 对话实录回放")
-                    with st.container(height=600, border=True):
-                        # 从数据库读取对话实录
-                        chat_log = row.get("对话实录", "无记录")
-                        if pd.isna(chat_log) or not str(chat_log).strip():
-                            st.warning("⚠️ 该记录未包含对话实录")
-                        else:
-                            render_dialogue(str(chat_log))
-            else:
-                st.info("👈 请在上方表格中点击一行，查看详细分析报告。")
+                        with st.expander("💡 话术优劣势分析", expanded=True):
+                            st.success(f"**做得好的**：\n{row['优点']}")
+                            st.error(f"**致命失误**：\n{row['失误点']}")
+                            st.info(f"**改进建议**：\n{row['下一步建议']}")
+
+                        # 折叠的 expander 内的代码同样会执行：改用开关，打开时才检索
+                        if st.toggle("🧭 相似高分案例 (复盘参考)", key=f"similar_{row.name}"):
+                            # 按记录ID读取案例，不受当前时间范围限制
+                            similar = dict(get_repository().find_similar(row.name, k=5, min_score=80))
+                            cases = get_repository().load_cases(list(similar)) if similar else pd.DataFrame()
+                            with st.container(border=True):
+                                if cases.empty:
+                                    st.caption("暂无相似的高分案例")
+                                for rid, case in cases.iterrows():
+                                    sim = similar[rid]
+                                    st.markdown(
+                                        f"**{case['患者姓名']}** · {case['咨询师']} · {case['评分']} 分 · 相似度 {sim:.0%}\n\n"
+                                        f"痛点：{case['痛点']}"
+                                    )
+
+                    with d_col2:
+                        st.markdown("### 📝 对话实录回放")
+                        with st.container(height=600, border=True):
+                            # 从数据库读取对话实录
+                            chat_log = get_repository().load_transcript(row.name, when=row["时间"])
+                            if not chat_log.strip():
+                                st.warning("⚠️ 该记录未包含对话实录")
+                            else:
+                                # 按记录ID区分控件状态：新记录写入后表格行号会变化
+                                render_dialogue(str(chat_log), key=f"replay_{row.name}")
+                else:
+                    st.info("👈 请在上方表格中点击一行，查看详细分析报告。")
                 
-        else:
-            st.empty()
-            with st.container():
-                st.markdown("""
-                <div style='text-align: center; color: #999; padding: 50px;'>
-                    <h3>📭 暂无数据</h3>
-                    <p>请等待咨询师上传录音文件</p>
-                </div>
-                """, unsafe_allow_html=True)
+            else:
+                st.empty()
+                with st.container():
+                    st.markdown("""
+                    <div style='text-align: center; color: #999; padding: 50px;'>
+                        <h3>📭 暂无数据</h3>
+                        <p>所选时间范围内没有记录，请切换时间范围或等待咨询师上传录音文件</p>
+                    </div>
+                    """, unsafe_allow_html=True)
+
+        with tab_trend:
+            render_trends()
+            if HAS_PYARROW:
+                st.divider()
+                render_snapshot_summary()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
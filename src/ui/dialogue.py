@@ -0,0 +1,49 @@
+import html
+import math
+from functools import lru_cache
+
+# 每页最多渲染的对话轮数：无论录音多长，单次渲染的 HTML 体积都有上限
+DIALOGUE_PAGE_SIZE = 60
+
+
+@lru_cache(maxsize=32)
+def parse_dialogue(text: str) -> tuple:
+    """
+    将对话实录解析为 (是否咨询师, 内容) 的元组序列
+    简单规则：默认说话人0是咨询师
+    """
+    turns = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        is_doctor = "说话人 0" in line or "咨询师" in line
+        content = line.split("】")[-1].replace(":", "").strip() if "】" in line else line
+        turns.append((is_doctor, content))
+    return tuple(turns)
+
+
+def page_count(total_turns: int, page_size: int = DIALOGUE_PAGE_SIZE) -> int:
+    return max(1, math.ceil(total_turns / page_size))
+
+
+def page_of_turn(turn_no: int, page_size: int = DIALOGUE_PAGE_SIZE) -> int:
+    """第 turn_no 轮 (从 1 开始) 所在的页码 (从 1 开始)"""
+    return (max(turn_no, 1) - 1) // page_size + 1
+
+
+def build_dialogue_html(turns, start: int = 0) -> str:
+    """
+    单次遍历拼接气泡 HTML，整页一次性交给 st.markdown
+    start 为本页第一轮在全文中的偏移，用于生成 turn-N 锚点
+    """
+    parts = []
+    for offset, (is_doctor, content) in enumerate(turns):
+        anchor = f"turn-{start + offset + 1}"
+        content = html.escape(content)
+        if is_doctor:
+            parts.append(f"<div id='{anchor}'><span class='speaker-label'>咨询师</span><div class='chat-doctor'>{content}</div></div>")
+        else:
+            parts.append(f"<div id='{anchor}' style='text-align:right'><span class='speaker-label'>患者</span><div class='chat-patient'>{content}</div></div>")
+    parts.append("<div style='clear:both'></div>")
+    return "".join(parts)
@@ -0,0 +1,46 @@
+import sys
+import os
+import subprocess
+import statistics
+
+# 冷启动基准：每次都在全新的子进程里导入，避免模块缓存干扰
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+HEAVY_MODULES = ("langchain_community", "dashscope", "oss2", "requests")
+REPEAT = 5
+
+CASES = {
+    "config.settings": "import config.settings",
+    "src.core": "import src.core",
+    "src.database": "import src.database",
+    "仓库实例化": "from src.database import ConsultationRepository; ConsultationRepository()",
+}
+
+PROBE = """
+import sys, time
+t = time.perf_counter()
+{stmt}
+cost = (time.perf_counter() - t) * 1000
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(f"{{cost:.1f}}|{{','.join(heavy)}}")
+"""
+
+
+def measure(stmt: str):
+    costs, heavy = [], ""
+    for _ in range(REPEAT):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE.format(stmt=stmt, heavy=HEAVY_MODULES)],
+            cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        cost, heavy = out.split("|")
+        costs.append(float(cost))
+    return statistics.median(costs), heavy
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print(f"⏱️  DCSA 冷启动导入耗时 (中位数, {REPEAT} 次)")
+    print("=" * 60)
+    for name, stmt in CASES.items():
+        cost, heavy = measure(stmt)
+        print(f"{name:<16} {cost:>8.1f} ms   重依赖: {heavy or '无'}")
@@ -0,0 +1,51 @@
+import sys
+import os
+import time
+import tempfile
+
+# 将根目录加入路径，便于直接以脚本方式运行
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+
+import pandas as pd
+from config.settings import settings
+from src.database.repository import ConsultationRepository, HAS_PYARROW
+
+SAMPLE_DB = os.path.join(PROJECT_ROOT, "data", "db", "dental_consultation_db.csv")
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+
+def make_dataset(rows: int) -> pd.DataFrame:
+    """以样例库为模板，合成指定行数的记录"""
+    sample = pd.read_csv(SAMPLE_DB, encoding="gbk")
+    df = sample.loc[sample.index.repeat(-(-rows // len(sample)))].head(rows).reset_index(drop=True)
+    df["咨询师"] = [f"Dr. {chr(65 + i % 8)}" for i in range(rows)]
+    df["患者姓名"] = [f"患者{i}" for i in range(rows)]
+    df["评分"] = [40 + i % 60 for i in range(rows)]
+    df["是否成交"] = ["是" if i % 3 == 0 else "否" for i in range(rows)]
+    return df
+
+
+def measure(repo: ConsultationRepository, compact: bool):
+    t = time.perf_counter()
+    df = repo.load_records(compact=compact)
+    cost = (time.perf_counter() - t) * 1000
+    return cost, df.memory_usage(deep=True).sum() / 1024 / 1024
+
+
+if __name__ == "__main__":
+    data = make_dataset(ROWS)
+    print("=" * 64)
+    print(f"📦 load_records 内存/耗时对比 ({ROWS} 行, pyarrow={'有' if HAS_PYARROW else '无'})")
+    print("=" * 64)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for encoding in ("gbk", "utf-8"):
+            settings.DB_PATH = os.path.join(tmp, f"bench_{encoding}.csv")
+            settings.DB_ENCODING = encoding
+            data.to_csv(settings.DB_PATH, index=False, encoding=encoding, errors="replace")
+            repo = ConsultationRepository()
+            for compact in (False, True):
+                cost, mem = measure(repo, compact)
+                mode = "紧凑" if compact else "完整"
+                print(f"{encoding:<6} {mode}   {cost:>9.1f} ms   {mem:>9.1f} MiB")
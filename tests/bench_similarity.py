@@ -0,0 +1,58 @@
+import sys
+import os
+import time
+import random
+import tempfile
+
+# 将根目录加入路径，便于直接以脚本方式运行
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+
+import pandas as pd
+from src.database.similarity import SimilarityIndex, document_text
+
+SAMPLE_DB = os.path.join(PROJECT_ROOT, "data", "db", "dental_consultation_db.csv")
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+PAINS = ["嫌贵", "怕痛", "担心不耐用", "不信任医生", "担心手术风险", "时间不方便", "担心美观", "对材料有疑虑"]
+
+
+def make_docs(rows: int):
+    """以样例实录为语料，随机拼接出指定数量的文档"""
+    sample = pd.read_csv(SAMPLE_DB, encoding="gbk").iloc[0]
+    lines = [l for l in sample["对话实录"].split("\n") if l.strip()]
+    rng = random.Random(42)
+    for i in range(rows):
+        pain = "、".join(rng.sample(PAINS, 2))
+        transcript = "\n".join(rng.sample(lines, 12))
+        yield i, document_text(pain, sample["摘要"], sample["失误点"], transcript), rng.randint(30, 100)
+
+
+def timed(fn, repeat: int = 20) -> float:
+    t = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t) * 1000 / repeat
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print(f"🧭 相似案例索引基准 ({ROWS} 条)")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SimilarityIndex(os.path.join(tmp, "bench.csv"))
+
+        t = time.perf_counter()
+        index.rebuild(make_docs(ROWS))
+        print(f"全量构建            {time.perf_counter() - t:>9.1f} s")
+
+        t = time.perf_counter()
+        index.add(ROWS, "嫌贵、怕痛 客户担心种植牙价格", 88)
+        print(f"增量添加 1 条        {(time.perf_counter() - t) * 1000:>9.1f} ms")
+
+        size = sum(os.path.getsize(os.path.join(index.index_dir, f)) for f in os.listdir(index.index_dir))
+        print(f"索引文件体积        {size / 1024 / 1024:>9.1f} MiB")
+
+        print(f"单条 top-5 查询      {timed(lambda: index.most_similar([7], k=5, min_score=80)):>9.1f} ms")
+        batch = list(range(0, ROWS, ROWS // 32))[:32]
+        print(f"32 条批量 top-5 查询  {timed(lambda: index.most_similar(batch, k=5), repeat=5):>9.1f} ms")
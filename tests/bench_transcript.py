@@ -0,0 +1,100 @@
+import sys
+import os
+import re
+import time
+import random
+
+# 将根目录加入路径，便于直接以脚本方式运行
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+
+import pandas as pd
+from src.core.transcript import compact_transcript, parse_turns
+
+SAMPLE_DB = os.path.join(PROJECT_ROOT, "data", "db", "dental_consultation_db.csv")
+SAMPLE_ENCODING = sys.argv[2] if len(sys.argv) > 2 else "gbk"
+DB_PATH = sys.argv[1] if len(sys.argv) > 1 else SAMPLE_DB
+
+# 端到端时延估算参数 (qwen-plus 量级的经验值，按实际压测结果调整)
+# 时延 ≈ 固定开销 + 输入 token × 预填充耗时 + 输出 token × 解码耗时；压缩只影响输入部分
+BASE_MS = 800
+PREFILL_MS_PER_TOKEN = 0.35
+DECODE_MS_PER_TOKEN = 25
+OUTPUT_TOKENS = 400
+# 系统提示词与模板的 token 数 (两种情况下相同)
+PROMPT_TOKENS = 150
+
+_CJK = re.compile(r"[一-鿿]")
+_ASCII_WORD = re.compile(r"[A-Za-z0-9]+")
+
+
+def count_tokens(text: str) -> int:
+    """优先使用 dashscope 的 Qwen 分词器；不可用时按 中文 1.4 字/token 估算"""
+    try:
+        from dashscope import get_tokenizer
+
+        return len(get_tokenizer("qwen-7b-chat").encode(text))
+    except Exception:
+        cjk = len(_CJK.findall(text))
+        words = len(_ASCII_WORD.findall(text))
+        others = len(re.sub(r"[一-鿿A-Za-z0-9\s]", "", text))
+        return round(cjk / 1.4 + words + others)
+
+
+def latency_ms(tokens: int) -> float:
+    return BASE_MS + (PROMPT_TOKENS + tokens) * PREFILL_MS_PER_TOKEN + OUTPUT_TOKENS * DECODE_MS_PER_TOKEN
+
+
+def with_asr_noise(text: str, seed: int) -> str:
+    """
+    合成样本：在真实实录上按 paraformer 常见输出注入噪声
+    (句首语气词、口吃式重复、"嗯。" "对对。" 附和短句)，用于观察填充词较多时的压缩效果
+    """
+    rng = random.Random(seed)
+    lines = []
+    for speaker, utterance in parse_turns(text):
+        if rng.random() < 0.5:
+            utterance = rng.choice(["嗯，", "呃，", "哎，", "啊，"]) + utterance
+        if rng.random() < 0.3 and len(utterance) > 4:
+            i = rng.randrange(len(utterance) - 2)
+            utterance = utterance[:i] + utterance[i:i + 2] * 2 + utterance[i:]
+        lines.append(f"【说话人 {speaker}】: {utterance}")
+        if rng.random() < 0.3:
+            other = "1" if speaker == "0" else "0"
+            lines.append(f"【说话人 {other}】: {rng.choice(['嗯。', '对对。', '好。', '哦，嗯。'])}")
+    return "\n\n".join(lines)
+
+
+def load_samples() -> list:
+    transcripts = pd.read_csv(DB_PATH, encoding=SAMPLE_ENCODING, usecols=["对话实录"])["对话实录"]
+    samples = [(f"记录 {i}", t) for i, t in transcripts.items() if isinstance(t, str) and t.strip()]
+    samples += [(f"{name} (合成噪声)", with_asr_noise(t, seed)) for seed, (name, t) in enumerate(samples[:5])]
+    return samples
+
+
+if __name__ == "__main__":
+    samples = load_samples()
+    print("=" * 78)
+    print(f"✂️  实录压缩基准 ({len(samples)} 份样本)")
+    print("=" * 78)
+    print(f"{'样本':<18}{'原文字符':>9}{'压缩后':>9}{'原文 token':>12}{'压缩后':>9}{'减少':>8}{'压缩耗时':>12}")
+
+    total_before = total_after = 0
+    latency_before = latency_after = 0.0
+    for name, raw in samples:
+        t = time.perf_counter()
+        compact = compact_transcript(raw)
+        cost = (time.perf_counter() - t) * 1000
+        before, after = count_tokens(raw), count_tokens(compact)
+        total_before += before
+        total_after += after
+        latency_before += latency_ms(before)
+        latency_after += latency_ms(after)
+        print(f"{name:<18}{len(raw):>9}{len(compact):>9}{before:>12}{after:>9}"
+              f"{(1 - after / before):>8.1%}{cost:>10.2f} ms")
+
+    print("-" * 78)
+    print(f"输入 token 合计    {total_before} -> {total_after} (减少 {1 - total_after / total_before:.1%})")
+    print(f"估算 LLM 时延/份   {latency_before / len(samples):.0f} ms -> {latency_after / len(samples):.0f} ms "
+          f"(节省 {(latency_before - latency_after) / len(samples):.0f} ms)")
+    print("注：时延为按 BASE_MS / PREFILL_MS_PER_TOKEN / DECODE_MS_PER_TOKEN 估算，未实际调用模型")
@@ -1,6 +1,8 @@
 import unittest
 import os
+import glob
 import shutil
+import pandas as pd
 # 注意：不需要再 import sys 来手动修补路径了！
 
 from src.core.models import ConsultationReport
@@ -41,6 +43,13 @@ class TestCoreSystem(unittest.TestCase):
                 os.remove(self.test_db_path)
             except PermissionError:
                 pass # 有时候文件占用会导致删除失败，忽略即可
+
+        # 清理测试库派生出的附属文件 (聚合表等)
+        for path in glob.glob(os.path.splitext(self.test_db_path)[0] + "_*"):
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.isfile(path):
+                os.remove(path)
                 
         # 还原配置
         settings.DB_PATH = self.original_db_path
@@ -139,6 +148,408 @@ class TestCoreSystem(unittest.TestCase):
             
         self.assertEqual(settings.APP_NAME, "Dental Consultation Supervisor Assistant")
 
+    def test_04_dashboard_frame_cache(self):
+        """
+        [测试 4] 看板派生表缓存
+        同一数据版本只构建一次；save_record 之后自动失效并重新派生。
+        """
+        print("\n🧪 Testing Dashboard Frame Cache...")
+
+        report = ConsultationReport(
+            summary="Cache Test", customer_intent="高", sales_score=72,
+            pain_points="怕痛", good_points="耐心", bad_points="无", next_step="复诊"
+        )
+        self.repo.save_record("Dr. Cache", "Patient A", "是", report, "【说话人 0】: 您好")
+
+        first = self.repo.load_dashboard_frame()
+        self.assertIs(first, self.repo.load_dashboard_frame(), "同一版本应命中缓存")
+        self.assertEqual(first.iloc[0]["成交状态"], "✅ 成交")
+        self.assertEqual(first.iloc[0]["评分"], 72)
+
+        self.repo.save_record("Dr. Cache", "Patient B", "否", report, "【说话人 0】: 您好")
+        second = self.repo.load_dashboard_frame()
+        self.assertIsNot(first, second, "保存后缓存应失效")
+        self.assertEqual(len(second), 2)
+        self.assertEqual(second.iloc[0]["成交状态"], "⏳ 待定")
+        print("   ✅ 缓存命中与失效逻辑正确。")
+
+    def test_05_dialogue_pagination(self):
+        """
+        [测试 5] 长对话分页渲染
+        每页 HTML 只包含固定数量的轮次，跳转轮次能定位到正确页码。
+        """
+        print("\n🧪 Testing Dialogue Pagination...")
+        from src.ui.dialogue import DIALOGUE_PAGE_SIZE, parse_dialogue, page_count, page_of_turn, build_dialogue_html
+
+        text = "\n\n".join(f"【说话人 {i % 2}】: 第{i + 1}句 <b>" for i in range(DIALOGUE_PAGE_SIZE * 3 + 5))
+        turns = parse_dialogue(text)
+        self.assertEqual(len(turns), DIALOGUE_PAGE_SIZE * 3 + 5)
+        self.assertEqual(page_count(len(turns)), 4)
+        self.assertEqual(page_of_turn(DIALOGUE_PAGE_SIZE), 1)
+        self.assertEqual(page_of_turn(DIALOGUE_PAGE_SIZE + 1), 2)
+
+        start = DIALOGUE_PAGE_SIZE
+        page_html = build_dialogue_html(turns[start:start + DIALOGUE_PAGE_SIZE], start)
+        self.assertEqual(page_html.count("class='chat-"), DIALOGUE_PAGE_SIZE)
+        self.assertIn(f"id='turn-{start + 1}'", page_html)
+        self.assertNotIn("<b>", page_html, "对话内容应做 HTML 转义")
+        print("   ✅ 分页与转义逻辑正确。")
+
+    def test_06_incremental_rollups(self):
+        """
+        [测试 6] 趋势聚合表
+        保存时的增量更新结果应与全量回填 (rebuild) 完全一致。
+        """
+        print("\n🧪 Testing Incremental Rollups...")
+
+        def make_report(score, bad):
+            return ConsultationReport(
+                summary="Rollup Test", customer_intent="中", sales_score=score,
+                pain_points="嫌贵", good_points="热情", bad_points=bad, next_step="回访"
+            )
+
+        self.repo.save_record("Dr. A", "P1", "是", make_report(80, "未挖掘预算；未问病史"), "【说话人 0】: 您好")
+        self.repo.save_record("Dr. A", "P2", "否", make_report(50, "未挖掘预算"), "【说话人 0】: 您好")
+        self.repo.save_record("Dr. B", "P3", "否", make_report(70, "无"), "【说话人 0】: 您好")
+
+        incremental = self.repo.load_trends("week")
+        row_a = incremental[incremental["咨询师"] == "Dr. A"].iloc[0]
+        self.assertEqual(row_a["接待量"], 2)
+        self.assertEqual(row_a["平均分"], 65.0)
+        self.assertEqual(row_a["成交率"], 50.0)
+        self.assertEqual(row_a["高频失误点"], "未挖掘预算")
+        self.assertFalse(os.path.exists(self.repo.rollups.path("day")), "保存记录只应追加增量日志，不重写聚合表")
+        self.assertIs(self.repo.load_trends("week"), incremental, "聚合文件未变化时应复用缓存")
+
+        cols = ["周期", "咨询师", "接待量", "成交量", "评分合计", "高频失误点"]
+        self.repo.rollups.fold()
+        self.assertFalse(os.path.exists(self.repo.rollups.delta_path))
+        folded = self.repo.load_trends("week")
+        self.assertTrue(incremental[cols].equals(folded[cols]), "并入聚合表前后结果应一致")
+
+        self.repo.save_record("Dr. A", "P4", "是", make_report(90, "未挖掘预算"), "【说话人 0】: 您好")
+        self.assertEqual(self.repo.load_trends("week").set_index("咨询师").loc["Dr. A", "接待量"], 3)
+        incremental = self.repo.load_trends("week")
+
+        self.repo.rebuild_rollups()
+        rebuilt = self.repo.load_trends("week")
+        self.assertTrue(incremental[cols].equals(rebuilt[cols]), "增量结果应与全量回填一致")
+        print("   ✅ 增量聚合与回填结果一致。")
+
+    def test_07_compact_load(self):
+        """
+        [测试 7] 紧凑加载模式
+        看板表格不携带对话实录，低基数字段为 category；UTF-8 主库写入无损。
+        """
+        print("\n🧪 Testing Compact Load...")
+
+        report = ConsultationReport(
+            summary="Compact Test", customer_intent="高", sales_score=88,
+            pain_points="怕痛", good_points="专业", bad_points="无", next_step="预约"
+        )
+        original_encoding = settings.DB_ENCODING
+        try:
+            for encoding in ("gbk", "utf-8"):
+                os.remove(self.test_db_path)
+                settings.DB_ENCODING = encoding
+                self.repo = ConsultationRepository()
+                transcript = "【说话人 0】: 您好\n\n【说话人 1】: 种植牙多少钱？"
+                self.repo.save_record("Dr. Compact", "P1", "是", report, transcript)
+                # 纯数字姓名：C 引擎与 Arrow 两条读取路径都应保持字符串
+                empty = report.model_copy(update={"pain_points": "", "next_step": ""})
+                self.repo.save_record("Dr. Compact", "007", "否", empty, "")
+
+                df = self.repo.load_records(compact=True)
+                self.assertNotIn("对话实录", df.columns)
+                self.assertEqual(str(df["咨询师"].dtype), "category")
+                self.assertEqual(str(df["评分"].dtype), "int16")
+                self.assertTrue(pd.api.types.is_datetime64_any_dtype(df["时间"]))
+
+                latest, first = df.iloc[0], df.iloc[1]
+                self.assertEqual(first["患者姓名"], "P1")
+                self.assertEqual(latest["患者姓名"], "007")
+                self.assertEqual(latest["痛点"], "", "空文本字段不应显示为 nan")
+                self.assertEqual(self.repo.load_dashboard_frame().iloc[0]["下一步建议"], "")
+                self.assertEqual(self.repo.load_transcript(first.name), transcript)
+                self.assertEqual(self.repo.load_transcript(latest.name), "")
+        finally:
+            settings.DB_ENCODING = original_encoding
+        print("   ✅ 紧凑加载与实录按需读取正常。")
+
+    def test_08_similar_cases(self):
+        """
+        [测试 8] 相似案例检索
+        增量索引能找回同类痛点的案例，并支持按评分过滤；全量重建后结果一致。
+        """
+        print("\n🧪 Testing Similar Case Retrieval...")
+
+        cases = [
+            ("P0", 45, "嫌种植牙太贵，担心术后疼痛", "未介绍分期付款方案"),
+            ("P1", 90, "嫌种植牙太贵，担心手术疼痛", "无"),
+            ("P2", 85, "孩子牙齿不齐，想做隐形矫正", "无"),
+            ("P3", 55, "种植牙价格太贵，害怕疼痛", "未强调无痛技术"),
+        ]
+        for patient, score, pain, bad in cases:
+            report = ConsultationReport(
+                summary=f"{patient} 咨询", customer_intent="中", sales_score=score,
+                pain_points=pain, good_points="耐心", bad_points=bad, next_step="回访"
+            )
+            self.repo.save_record("Dr. Sim", patient, "否", report, f"【说话人 1】: {pain}")
+
+        self.assertEqual(len(self.repo.similarity), 4)
+        self.assertEqual(self.repo.similarity.pending(), 4, "保存记录时不应重建倒排表")
+        hits = self.repo.find_similar(0, k=3)
+        self.assertIn(hits[0][0], (1, 3), "最相似的应是同样嫌贵怕痛的种植案例")
+        self.assertNotIn(0, [rid for rid, _ in hits], "结果不应包含自身")
+
+        high = self.repo.find_similar(0, k=3, min_score=80)
+        self.assertEqual(high[0][0], 1, "按评分过滤后应返回高分的同类案例")
+        self.assertTrue(all(rid in (1, 2) for rid, _ in high))
+
+        # 倒排表由定时任务生成：尾部未达阈值时跳过，生成后查询结果不变
+        self.assertEqual(self.repo.compact_similarity(), [])
+        self.assertEqual(self.repo.compact_similarity(force=True), [self.repo.similarity.index_dir])
+        self.assertEqual(self.repo.similarity.pending(), 0)
+        self.assertEqual(self.repo.find_similar(0, k=3, min_score=80), high)
+
+        self.repo.rebuild_similarity()
+        self.assertEqual(self.repo.find_similar(0, k=1, min_score=80)[0][0], 1)
+        print("   ✅ 相似案例检索正常。")
+
+    def test_09_monthly_partitions(self):
+        """
+        [测试 9] 按月分区存储
+        单文件迁移后记录ID不变；按时间范围只读取相关分区；已结束月份归档为 Parquet 后仍可读取。
+        """
+        print("\n🧪 Testing Monthly Partitions...")
+
+        report = ConsultationReport(
+            summary="Partition Test", customer_intent="中", sales_score=66,
+            pain_points="嫌贵", good_points="耐心", bad_points="无", next_step="回访"
+        )
+        self.repo.save_record("Dr. Old", "P0", "否", report, "【说话人 0】: 去年的记录")
+        self.repo.save_record("Dr. New", "P1", "是", report, "【说话人 0】: 本月的记录")
+
+        # 把第一条改成历史月份，模拟跨月数据
+        raw = pd.read_csv(self.test_db_path, encoding=settings.DB_ENCODING)
+        raw.loc[0, "时间"] = "2025-01-15 10:00"
+        raw.to_csv(self.test_db_path, index=False, encoding=settings.DB_ENCODING)
+
+        self.assertEqual(self.repo.migrate_to_partitions(), 2)
+        try:
+            settings.DB_PARTITIONED = True
+            repo = ConsultationRepository()
+            self.assertEqual(len(repo._data_files()), 2)
+
+            this_month = pd.Timestamp.now().strftime("%Y-%m-01")
+            self.assertEqual(len(repo._data_files(start=this_month)), 1, "应按月份裁剪分区")
+            recent = repo.load_records(compact=True, start=this_month)
+            self.assertEqual(list(recent["患者姓名"]), ["P1"])
+
+            archived = repo.compact_partitions()
+            self.assertEqual(len(archived), 1)
+            self.assertTrue(archived[0].endswith("2025-01.parquet"))
+
+            repo.save_record("Dr. New", "P2", "否", report, "【说话人 0】: 新增记录")
+            df = repo.load_records(compact=True)
+            self.assertEqual(list(df.index), [2, 1, 0], "记录ID应沿用原行号并继续递增")
+            self.assertEqual(repo.load_transcript(0, when=df.loc[0, "时间"]), "【说话人 0】: 去年的记录")
+            self.assertEqual(repo.load_transcript(2), "【说话人 0】: 新增记录")
+            self.assertIn(repo.find_similar(2, k=1)[0][0], (0, 1))
+            # 相似案例按记录ID读取，不受看板时间范围限制
+            self.assertEqual(list(repo.load_cases([0, 2])["患者姓名"]), ["P0", "P2"])
+
+            with self.assertRaises(ValueError, msg="重复迁移会产生重复记录ID"):
+                self.repo.migrate_to_partitions()
+            self.assertEqual(len(repo.load_records(compact=True)), 3)
+
+            # 门店部署：聚合表 / 相似索引 / 快照按门店隔离，门店记录同时计入总部聚合表
+            settings.CLINIC_NAME = "北区"
+            clinic_repo = ConsultationRepository()
+            self.assertTrue(clinic_repo.rollups.base_path.startswith(repo._partition_dir("北区")))
+            self.assertTrue(clinic_repo.snapshots.snapshot_dir.startswith(repo._partition_dir("北区")))
+            self.assertTrue(clinic_repo.similarity.index_dir.startswith(repo._partition_dir("北区")))
+            indexed = len(repo.similarity)
+            clinic_repo.save_record("Dr. North", "P3", "是", report, "【说话人 0】: 北区记录")
+            self.assertEqual(len(clinic_repo.similarity), 1)
+            self.assertEqual(len(repo.similarity), indexed + 1, "门店记录应同时加入总部索引")
+            clinic_repo.rebuild_rollups()
+            self.assertEqual(set(clinic_repo.load_trends("month")["咨询师"]), {"Dr. North"})
+            self.assertIn("Dr. North", set(repo.load_trends("month")["咨询师"]))
+            self.assertIn("Dr. New", set(repo.load_trends("month")["咨询师"]), "门店回填不应覆盖总部聚合表")
+            clinic_repo.export_snapshot()
+            self.assertEqual(clinic_repo.load_snapshots(["门店"])["门店"].to_pylist(), ["北区"])
+        finally:
+            settings.DB_PARTITIONED = False
+            settings.CLINIC_NAME = ""
+        print("   ✅ 分区迁移、裁剪与归档正常。")
+
+    def test_10_columnar_snapshots(self):
+        """
+        [测试 10] 列式快照导出
+        schema 由 ConsultationReport 推导；增量导出只包含新记录；Arrow / Parquet 快照可合并读取。
+        """
+        print("\n🧪 Testing Columnar Snapshots...")
+        from src.database.repository import HAS_PYARROW
+        if not HAS_PYARROW:
+            self.skipTest("未安装 pyarrow")
+        from src.database.snapshots import snapshot_schema
+
+        report = ConsultationReport(
+            summary="Snapshot Test", customer_intent="高", sales_score=77,
+            pain_points="怕痛", good_points="专业", bad_points="无", next_step="预约"
+        )
+        self.repo.save_record("Dr. Arrow", "007", "是", report, "【说话人 0】: 您好")
+        self.repo.save_record("Dr. Arrow", "P2", "否", report, "")
+        first = self.repo.export_snapshot()
+        self.assertTrue(first.endswith(".arrow"))
+        self.assertIsNone(self.repo.export_snapshot(), "没有新记录时不应生成快照")
+
+        # 模拟 v1 快照 (没有 门店 列)：读取时补空值，与新版本快照合并
+        import pyarrow as pa
+        with pa.OSFile(first, "rb") as source:
+            v1 = pa.ipc.open_file(source).read_all().drop_columns(["门店"])
+        with pa.OSFile(first, "wb") as sink, pa.ipc.new_file(sink, v1.schema) as writer:
+            writer.write_table(v1)
+
+        self.repo.save_record("Dr. Parquet", "P3", "否", report, "【说话人 1】: 多少钱")
+        self.assertTrue(self.repo.export_snapshot(fmt="parquet").endswith(".parquet"))
+
+        table = self.repo.load_snapshots()
+        self.assertTrue(table.schema.equals(snapshot_schema()))
+        self.assertEqual(table.num_rows, 3)
+        self.assertEqual(table["记录ID"].to_pylist(), [0, 1, 2])
+        self.assertEqual(table["患者姓名"].to_pylist()[0], "007", "患者姓名应保持字符串")
+        self.assertEqual(table["评分"].to_pylist(), [77, 77, 77])
+        self.assertEqual(table.schema.field("评分").metadata[b"field"], b"sales_score")
+        self.assertEqual(table["门店"].null_count, 3, "单文件模式下 门店 为空")
+
+        frame = self.repo.load_snapshots(["咨询师", "评分"], as_pandas=True)
+        self.assertEqual(list(frame["咨询师"].astype(str)), ["Dr. Arrow", "Dr. Arrow", "Dr. Parquet"])
+
+        # 多个快照各有一份字典，看板聚合应能跨快照分组；汇总按 manifest 版本缓存，导出后刷新
+        cached = self.repo.load_snapshot_summary()
+        self.assertIs(self.repo.load_snapshot_summary(), cached)
+        self.repo.save_record("Dr. Third", "P4", "是", report, "")
+        self.repo.export_snapshot()
+        summary = self.repo.load_snapshot_summary().set_index("咨询师")
+        self.assertEqual(summary.loc["Dr. Arrow", "接待量"], 2)
+        self.assertEqual(summary.loc["Dr. Arrow", "成交率"], 50.0)
+        self.assertEqual(summary.loc["Dr. Third", "成交率"], 100.0)
+        self.assertEqual(set(summary.index), {"Dr. Arrow", "Dr. Parquet", "Dr. Third"})
+        print("   ✅ 快照导出与读取正常。")
+
+    def test_11_transcript_compaction(self):
+        """
+        [测试 11] 送入 LLM 前的实录压缩
+        去掉语气词与重复、折叠连续附和并合并同一说话人；应答/同意、叠词、数字与报价保留。
+        """
+        print("\n🧪 Testing Transcript Compaction...")
+        from src.core.transcript import clean_utterance, compact_transcript
+
+        raw = (
+            "【说话人 0】: 嗯，您好，请问牙齿哪里不舒服？\n\n"
+            "【说话人 1】: 呃，大牙疼疼疼，想想想拔了。\n\n"
+            "【说话人 0】: 您有高血压吗？\n\n"
+            "【说话人 1】: 没有。\n\n"
+            "【说话人 0】: 种一颗  一千六百六十六，这个这个这个有优惠。\n\n"
+            "【说话人 1】: 嗯嗯。\n\n"
+            "【说话人 0】: 好。\n\n"
+            "【说话人 1】: 呃。\n\n"
+            "【说话人 0】: 那就定这个方案，下周来种。那就定这个方案，下周来种。\n\n"
+            "【说话人 1】: 好的。"
+        )
+        compact = compact_transcript(raw)
+        self.assertEqual(compact, "\n".join([
+            "【说话人 0】: 您好，请问牙齿哪里不舒服？",
+            "【说话人 1】: 大牙疼，想拔了。",
+            "【说话人 0】: 您有高血压吗？",
+            "【说话人 1】: 没有。",
+            "【说话人 0】: 种一颗 一千六百六十六，这个有优惠。",
+            "【说话人 1】: 嗯。",
+            "【说话人 0】: 那就定这个方案，下周来种。",
+            "【说话人 1】: 好的。",
+        ]), "对实质内容的应答 (嗯/好的) 应保留，只折叠附和之后的附和")
+        self.assertEqual(compact_transcript(compact), compact, "压缩应当幂等")
+        self.assertEqual(compact_transcript("（未识别到有效内容）"), "（未识别到有效内容）")
+
+        # 叠词与数字串不折叠
+        for text in ("一颗一颗来做", "考虑考虑", "一三八一三八零", "一三八一三八一三八零", "八个八个八个", "1000，1000块"):
+            self.assertEqual(clean_utterance(text), text)
+        self.assertEqual(clean_utterance("我们打桩要要要要出钱，就这个这个这个酒"), "我们打桩要出钱，就这个酒")
+
+        # 无说话人标签的行各自成轮、不拼接；带标签轮次的续行以句号衔接
+        self.assertEqual(compact_transcript("咨询师：您好\n患者：牙疼"), "咨询师：您好\n患者：牙疼")
+        self.assertEqual(compact_transcript("【说话人 0】: 您好\n请坐\n【说话人 1】: 牙疼"), "【说话人 0】: 您好。请坐\n【说话人 1】: 牙疼")
+        print("   ✅ 实录压缩正常。")
+
+    def test_12_reencode_database(self):
+        """
+        [测试 12] 主库编码转换
+        gbk 主库转换为 utf-8 后内容无损 (含多行实录与纯数字姓名)；重复执行时跳过已转换文件。
+        """
+        print("\n🧪 Testing Database Re-encoding...")
+        report = ConsultationReport(
+            summary="Reencode Test", customer_intent="中", sales_score=66,
+            pain_points="嫌贵", good_points="耐心", bad_points="无", next_step="回访"
+        )
+        transcript = "【说话人 0】: 您好\n\n【说话人 1】: 种植牙多少钱？"
+        original_encoding = settings.DB_ENCODING
+        try:
+            settings.DB_ENCODING = "gbk"
+            self.repo = ConsultationRepository()
+            self.repo.save_record("Dr. 编码", "007", "是", report, transcript)
+            before = self.repo.load_records()
+
+            self.assertEqual(self.repo.reencode("utf-8"), [self.test_db_path])
+            self.assertEqual(self.repo.reencode("utf-8"), [], "已转换的文件应跳过")
+
+            settings.DB_ENCODING = "utf-8"
+            self.repo = ConsultationRepository()
+            after = self.repo.load_records()
+            self.assertTrue(before.equals(after), "转换前后记录应一致")
+            self.assertEqual(after.iloc[0]["患者姓名"], "007")
+            self.assertEqual(self.repo.load_transcript(after.index[0]), transcript)
+        finally:
+            settings.DB_ENCODING = original_encoding
+        print("   ✅ 编码转换无损。")
+
+    def test_13_concurrent_saves(self):
+        """
+        [测试 13] 多会话并发保存
+        看板的仓库实例在所有会话间共享：并发保存不应丢失明细、聚合计数或索引条目。
+        """
+        print("\n🧪 Testing Concurrent Saves...")
+        from concurrent.futures import ThreadPoolExecutor
+
+        report = ConsultationReport(
+            summary="Concurrent Test", customer_intent="中", sales_score=75,
+            pain_points="嫌贵", good_points="耐心", bad_points="未挖掘预算", next_step="回访"
+        )
+
+        def save(i):
+            return self.repo.save_record("Dr. Thread", f"P{i}", "是", report, f"【说话人 1】: 第{i}位患者")
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            self.assertTrue(all(pool.map(save, range(8))))
+
+        self.assertEqual(len(self.repo.load_records()), 8)
+        self.assertEqual(self.repo.load_trends("day")["接待量"].sum(), 8)
+        self.assertEqual(len(self.repo.similarity), 8)
+
+        # 分区模式：各自独立的仓库实例 (相当于多个进程) 并发分配记录ID，不应重复
+        try:
+            settings.DB_PARTITIONED = True
+            repos = [ConsultationRepository() for _ in range(8)]
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                list(pool.map(lambda i: repos[i].save_record("Dr. Thread", f"Q{i}", "否", report, ""), range(8)))
+            df = repos[0].load_records(compact=True)
+            self.assertEqual(sorted(df.index), list(range(8)), "记录ID应唯一且连续")
+            self.assertEqual(repos[0].load_transcript(0), "")
+        finally:
+            settings.DB_PARTITIONED = False
+        print("   ✅ 并发保存无丢失。")
+
 if __name__ == "__main__":
     unittest.main()
 '''